@@ -1,16 +1,10 @@
-from src.data_loader import load_all_documents
-from src.vectorstore import FaissVectorStore
-from src.search import RAGSearch
+from src.client import RAGClient
 
-# Example usage
+# Example usage: a thin client of the retrieval server (start it with `python -m src.server`)
 if __name__ == "__main__":
     
-    docs = load_all_documents("data")
-    store = FaissVectorStore("faiss_store")
-    #store.build_from_documents(docs)
-    store.load()
-    #print(store.query("What is attention mechanism?", top_k=3))
-    rag_search = RAGSearch()
+    client = RAGClient()
+    #print(client.search("What is attention mechanism?", top_k=3))
     query = "What is attention mechanism?"
-    summary = rag_search.search_and_summarize(query, top_k=3)
+    summary = client.search_and_summarize(query, top_k=3)
     print("Summary:", summary)
@@ -0,0 +1,116 @@
+"""
+Recall@k vs. latency report for the Faiss index types supported by FaissVectorStore.
+
+Every index type is compared against an exact IndexFlatL2 baseline over the same vectors,
+sweeping the query-time knobs (nprobe for IVF, efSearch for HNSW).
+
+Usage:
+    python -m benchmarks.ann_benchmark --store faiss_store           # vectors of a built store
+    python -m benchmarks.ann_benchmark --synthetic 200000 --dim 384  # clustered random vectors
+"""
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from src.index_factory import index_config, create_index, train_index, search_parameters
+
+SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "ivf_pq": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "hnsw": [{"ef_search": e} for e in (16, 32, 64, 128, 256)],
+}
+
+
+def synthetic_vectors(n: int, dim: int, n_clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype('float32')
+    labels = rng.integers(0, n_clusters, size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype('float32')
+
+
+def store_vectors(persist_dir: str) -> np.ndarray:
+    index = faiss.read_index(f"{persist_dir}/faiss.index")
+    ids = faiss.vector_to_array(index.id_map) if isinstance(index, faiss.IndexIDMap) else np.arange(index.ntotal)
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype('float32')
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, top_k: int, index_params: dict):
+    ground = faiss.IndexFlatL2(vectors.shape[1])
+    ground.add(vectors)
+    _, truth = ground.search(queries, top_k)
+    ids = np.arange(vectors.shape[0], dtype='int64')
+
+    rows = []
+    for index_type, sweep in SWEEPS.items():
+        config = index_config(index_type, index_params)
+        start = time.perf_counter()
+        index = create_index(config, vectors.shape[1], n_train=vectors.shape[0])
+        train_index(index, vectors, config["params"]["train_size"])
+        index.add_with_ids(vectors, ids)
+        build_s = time.perf_counter() - start
+        for knobs in sweep:
+            params = search_parameters(index, config, **knobs)
+            latencies, found = [], []
+            # One query at a time, as the app issues them
+            for q in queries:
+                t0 = time.perf_counter()
+                _, I = index.search(q[None, :], top_k, params=params)
+                latencies.append(time.perf_counter() - t0)
+                found.append(I[0])
+            latencies = np.array(latencies) * 1000
+            rows.append({
+                "index_type": index_type,
+                **knobs,
+                "build_s": round(build_s, 3),
+                f"recall@{top_k}": round(recall_at_k(np.array(found), truth), 4),
+                "latency_ms_mean": round(float(latencies.mean()), 4),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="persist_dir of a built FaissVectorStore")
+    parser.add_argument("--synthetic", type=int, default=100000, help="number of synthetic vectors if --store is not given")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--json", help="write rows to this JSON file")
+    args = parser.parse_args()
+
+    vectors = store_vectors(args.store) if args.store else synthetic_vectors(args.synthetic, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(vectors.shape[0], min(args.queries, vectors.shape[0]), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype('float32')
+    print(f"[INFO] Benchmarking {vectors.shape[0]} vectors (dim={vectors.shape[1]}), {len(queries)} queries, k={args.top_k}")
+
+    index_params = {"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m}
+    rows = run(vectors, queries.astype('float32'), args.top_k, index_params)
+
+    header = f"{'index':<10}{'knob':<16}{'build s':>10}{'recall@' + str(args.top_k):>12}{'mean ms':>10}{'p95 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        knob = next((f"{k}={row[k]}" for k in ("nprobe", "ef_search") if k in row), "-")
+        print(f"{row['index_type']:<10}{knob:<16}{row['build_s']:>10}{row[f'recall@{args.top_k}']:>12}"
+              f"{row['latency_ms_mean']:>10}{row['latency_ms_p95']:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[INFO] Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
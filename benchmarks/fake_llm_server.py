@@ -0,0 +1,114 @@
+"""
+Local stand-in for the Groq chat completions API, for benchmarks and load tests.
+
+Answers are deterministic (derived from a hash of the prompt) and latency is simulated
+with a fixed time-to-first-token plus a per-token delay. Both plain and streaming
+(server-sent events) responses are supported. Point ChatGroq at it with
+GROQ_API_BASE=http://127.0.0.1:<port>.
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 8765 --ttft 0.2 --token-delay 0.01
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+WORDS = ("the", "document", "describes", "experience", "with", "react", "python", "models", "attention",
+         "context", "and", "results", "in", "summary", "skills", "project", "team", "data")
+
+
+def fake_answer(prompt: str, n_tokens: int) -> List[str]:
+    """Deterministic pseudo-answer: the same prompt always yields the same tokens."""
+    seed = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return [WORDS[seed[i % len(seed)] % len(WORDS)] + " " for i in range(n_tokens)]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    ttft = 0.2
+    token_delay = 0.01
+    n_tokens = 50
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        model = body.get("model", "fake")
+        tokens = fake_answer(prompt, self.n_tokens)
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(tokens),
+                 "total_tokens": len(prompt.split()) + len(tokens)}
+        time.sleep(self.ttft)
+        if body.get("stream"):
+            self._stream(model, tokens, usage)
+        else:
+            time.sleep(self.token_delay * len(tokens))
+            self._send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            })
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model: str, tokens: List[str], usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens + [None]):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token} if token else {},
+                                  "finish_reason": None if token else "stop", "logprobs": None}]}
+            if token is None:
+                chunk["x_groq"] = {"usage": usage}
+            elif i:
+                time.sleep(self.token_delay)
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(port: int = 0, ttft: float = 0.2, token_delay: float = 0.01, n_tokens: int = 50) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the fake server on a background thread; returns (server, base_url)."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,),
+                   {"ttft": ttft, "token_delay": token_delay, "n_tokens": n_tokens})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=50, help="tokens per answer")
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.ttft, args.token_delay, args.tokens)
+    print(f"[INFO] Fake LLM server listening on {url} (set GROQ_API_BASE={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Load test for RAGSearch.asearch_and_summarize against a local fake LLM server.
+
+Runs a fixed number of requests at each concurrency level and reports throughput and
+p50/p95/p99 latency. The answer cache is disabled so every request hits the LLM.
+
+Usage:
+    python -m benchmarks.load_test --store faiss_store --concurrency 1 4 16 64 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from benchmarks.fake_llm_server import start_server
+
+QUERIES = ("What are the technical skills?", "Summarize the work experience", "What is attention mechanism?",
+           "Which frameworks are mentioned?", "What projects were delivered?", "What education is listed?")
+
+
+def percentiles(latencies) -> dict:
+    values = np.array(latencies) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 2) for p in (50, 95, 99)}
+
+
+async def run_level(rag, concurrency: int, n_requests: int, top_k: int, stream: bool) -> dict:
+    latencies = []
+    client_slots = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        # Distinct text per request so the query cache doesn't hide embedding cost
+        query = f"{QUERIES[i % len(QUERIES)]} ({i})"
+        async with client_slots:
+            start = time.perf_counter()
+            if stream:
+                async for _ in rag.astream_search_and_summarize(query, top_k=top_k):
+                    pass
+            else:
+                await rag.asearch_and_summarize(query, top_k=top_k)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "requests": n_requests, "throughput_rps": round(n_requests / elapsed, 2),
+            **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="faiss_store")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-concurrency", type=int, default=32, help="RAGSearch in-flight limit")
+    parser.add_argument("--retrieval-workers", type=int, default=4, help="threads for embedding/Faiss work")
+    parser.add_argument("--query-batch", type=int, default=1, help="coalesce up to this many concurrent queries")
+    parser.add_argument("--query-batch-wait-ms", type=float, default=5.0)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--stream", action="store_true", help="use astream_search_and_summarize")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    server, url = start_server(ttft=args.ttft, token_delay=args.token_delay, n_tokens=args.tokens)
+    os.environ["GROQ_API_BASE"] = url
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    from src.cache import SemanticAnswerCache
+    from src.search import RAGSearch
+    # A threshold above 1 can never match, which disables answer caching
+    rag = RAGSearch(persist_dir=args.store, answer_cache=SemanticAnswerCache(similarity_threshold=1.1),
+                    max_concurrency=args.max_concurrency, retrieval_workers=args.retrieval_workers,
+                    query_batch_size=args.query_batch, query_batch_wait_ms=args.query_batch_wait_ms)
+    rag.retrieve("warm up")
+
+    rows = []
+    for level in args.concurrency:
+        row = asyncio.run(run_level(rag, level, args.requests, args.top_k, args.stream))
+        rows.append(row)
+        print(f"[INFO] concurrency={row['concurrency']:<4} throughput={row['throughput_rps']:>8} req/s  "
+              f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms p99={row['p99_ms']}ms")
+    server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[INFO] Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Memory, latency and recall of the vector storage precisions supported by FaissVectorStore.
+
+For each metric (l2, cosine) the float32 index is the baseline; float16 and SQ8 storage are
+reported against it, with recall@k measured against an exact float32 search in that metric.
+
+Usage:
+    python -m benchmarks.precision_benchmark                     # embed the bundled books.jsonl
+    python -m benchmarks.precision_benchmark --store faiss_store  # vectors of a built store
+    python -m benchmarks.precision_benchmark --synthetic 100000 --dim 384
+"""
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from benchmarks.ann_benchmark import synthetic_vectors, store_vectors, recall_at_k
+from src.index_factory import STORAGE_CODES, METRICS, index_config, create_index, train_index, search_parameters, prepare_vectors
+
+
+def corpus_vectors(path: str, model_name: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> np.ndarray:
+    """Chunk and embed a JSONL corpus, one document per record (its "text" field, or "key: value" lines)."""
+    from langchain_core.documents import Document
+    from src.embedding import EmbeddingPipeline
+    documents = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text") or "\n".join(
+                f"{k}: {', '.join(map(str, v)) if isinstance(v, list) else v}" for k, v in record.items())
+            documents.append(Document(page_content=text, metadata={"source": path}))
+    pipeline = EmbeddingPipeline(model_name=model_name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return np.asarray(pipeline.embed_chunks(pipeline.chunk_documents(documents)), dtype='float32')
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, top_k: int, index_type: str, index_params: dict):
+    ids = np.arange(vectors.shape[0], dtype='int64')
+    rows = []
+    for metric in METRICS:
+        exact = create_index(index_config("flat", {"metric": metric}), vectors.shape[1])
+        exact.add_with_ids(prepare_vectors(index_config("flat", {"metric": metric}), vectors), ids)
+        baseline = None
+        for storage in STORAGE_CODES:
+            config = index_config(index_type, {**index_params, "metric": metric, "storage": storage})
+            data, qs = prepare_vectors(config, vectors), prepare_vectors(config, queries)
+            _, truth = exact.search(qs, top_k)
+            start = time.perf_counter()
+            index = create_index(config, vectors.shape[1], n_train=vectors.shape[0])
+            train_index(index, data, config["params"]["train_size"])
+            index.add_with_ids(data, ids)
+            build_s = time.perf_counter() - start
+            params = search_parameters(index, config)
+            latencies, found = [], []
+            # One query at a time, as the app issues them
+            for q in qs:
+                t0 = time.perf_counter()
+                _, I = index.search(q[None, :], top_k, params=params)
+                latencies.append(time.perf_counter() - t0)
+                found.append(I[0])
+            latencies = np.array(latencies) * 1000
+            row = {
+                "metric": metric,
+                "storage": storage,
+                "build_s": round(build_s, 3),
+                "index_bytes": int(faiss.serialize_index(index).size),
+                f"recall@{top_k}": round(recall_at_k(np.array(found), truth), 4),
+                "latency_ms_mean": round(float(latencies.mean()), 4),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+            }
+            baseline = baseline or row
+            row["memory_ratio"] = round(baseline["index_bytes"] / row["index_bytes"], 2)
+            row["speedup"] = round(baseline["latency_ms_mean"] / max(row["latency_ms_mean"], 1e-9), 2)
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="books.jsonl", help="JSONL corpus to chunk and embed")
+    parser.add_argument("--store", help="persist_dir of a built FaissVectorStore (instead of --corpus)")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many synthetic vectors instead of --corpus")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--json", help="write rows to this JSON file")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = store_vectors(args.store)
+    elif args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        vectors = corpus_vectors(args.corpus, args.model)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(vectors.shape[0], min(args.queries, vectors.shape[0]), replace=False)]
+    queries = (queries + 0.05 * rng.normal(size=queries.shape)).astype('float32')
+    print(f"[INFO] Benchmarking {vectors.shape[0]} vectors (dim={vectors.shape[1]}), {len(queries)} queries, "
+          f"k={args.top_k}, index={args.index_type}")
+
+    rows = run(vectors, queries, args.top_k, args.index_type, {})
+
+    recall_key = f"recall@{args.top_k}"
+    header = (f"{'metric':<8}{'storage':<9}{'MiB':>9}{'x mem':>7}{recall_key:>11}"
+              f"{'mean ms':>10}{'p95 ms':>10}{'x speed':>9}")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['metric']:<8}{row['storage']:<9}{row['index_bytes'] / 2**20:>9.2f}{row['memory_ratio']:>7}"
+              f"{row[recall_key]:>11}{row['latency_ms_mean']:>10}{row['latency_ms_p95']:>10}{row['speedup']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[INFO] Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
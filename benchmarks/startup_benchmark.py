@@ -0,0 +1,88 @@
+"""
+Cold-start time of RAGSearch: imports, store load and first query, each run in a fresh
+interpreter so nothing is already imported, loaded or cached.
+
+Modes:
+    eager      index read fully into memory, model loaded by the first query
+    mmap       index memory-mapped (RAGSearch default)
+    mmap+warm  index memory-mapped, model warmed on a background thread at construction
+
+--ui-delay stands in for the time a UI spends rendering between constructing RAGSearch
+and the first query; background warming overlaps with it. first_result_s is the wall time
+from interpreter start to the first retrieval result, UI delay included.
+
+Usage:
+    python -m benchmarks.startup_benchmark --store faiss_store --runs 5 --ui-delay 1.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+MODES = {
+    "eager": {"mmap_index": False, "warm_model": False},
+    "mmap": {"mmap_index": True, "warm_model": False},
+    "mmap+warm": {"mmap_index": True, "warm_model": True},
+}
+
+
+def child(mode: str, store: str, ui_delay: float):
+    """Runs inside the fresh interpreter; prints one JSON line of timings."""
+    start = time.perf_counter()
+    from src.search import RAGSearch
+    imported = time.perf_counter()
+    rag = RAGSearch(persist_dir=store, **MODES[mode])
+    constructed = time.perf_counter()
+    time.sleep(ui_delay)
+    query_start = time.perf_counter()
+    rag.retrieve("What are the technical skills?")
+    done = time.perf_counter()
+    print(json.dumps({"import_s": imported - start, "construct_s": constructed - imported,
+                      "first_query_s": done - query_start, "first_result_s": done - start}))
+
+
+def run_mode(mode: str, store: str, ui_delay: float, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--child", mode, "--store", store,
+                              "--ui-delay", str(ui_delay)], capture_output=True, text=True, check=True,
+                             env={**os.environ, "RAG_LOG_LEVEL": "WARNING"})
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"mode": mode, "runs": runs,
+            **{key: round(float(np.median([s[key] for s in samples])), 3) for key in samples[0]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="faiss_store", help="persist_dir of a built store")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per mode; medians are reported")
+    parser.add_argument("--ui-delay", type=float, default=1.0, help="seconds between construction and first query")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--child", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.store, args.ui_delay)
+        return
+    from src.sharded_store import store_exists
+    if not store_exists(args.store):
+        parser.error(f"no built store at {args.store}; build one first (e.g. python -m src.vectorstore)")
+
+    rows = []
+    print(f"{'mode':<11}{'import s':>10}{'construct s':>13}{'1st query s':>13}{'1st result s':>14}")
+    for mode in args.modes:
+        row = run_mode(mode, args.store, args.ui_delay, args.runs)
+        rows.append(row)
+        print(f"{mode:<11}{row['import_s']:>10}{row['construct_s']:>13}{row['first_query_s']:>13}{row['first_result_s']:>14}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[INFO] Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark suite: ingestion, embedding, index build, query latency, memory and recall.
+
+Each corpus is indexed from scratch into a temporary store with a fresh embedding cache,
+then queried through RAGSearch against the deterministic fake LLM server, so runs are
+repeatable and never touch faiss_store/, embedding_cache/ or the Groq API.
+
+Corpora:
+    data   the files under data/ (or --data-dir)
+    books  a synthetic text corpus generated from books.jsonl, --books-docs files of
+           --books-per-doc records each (seeded, so every run indexes the same text)
+
+Results are written to JSON together with the git commit, so runs from two commits can be diffed
+with --compare (exit status 1 if any metric regressed by more than --tolerance).
+
+Usage:
+    python -m benchmarks.suite --json bench-new.json
+    python -m benchmarks.suite --corpus books --books-docs 2000 --index-type hnsw
+    python -m benchmarks.suite --compare bench-old.json bench-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+from benchmarks.ann_benchmark import recall_at_k
+from benchmarks.fake_llm_server import start_server
+from benchmarks.load_test import QUERIES, percentiles
+
+BOOK_QUERY_TEMPLATES = ("Which books did {author} write?", "Tell me about {title}",
+                        "What is the rating of {title}?", "Books published in {year}")
+
+# Metrics where a larger value is better; everything else numeric is a cost
+HIGHER_IS_BETTER = ("_per_sec", "recall@")
+# Workload size, not performance: shown in comparisons but never flagged
+WORKLOAD_KEYS = ("files", "documents", "chunks", "input_bytes", "vectors", "workers")
+
+
+def git_commit() -> dict:
+    """HEAD commit and whether the work tree has uncommitted changes, if this is a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def book_text(record: dict) -> str:
+    authors = ", ".join(record.get("authors") or ["an unknown author"])
+    return (f"{record['title']} was written by {authors} and published in {record.get('publication_year') or 'an unknown year'}. "
+            f"It has an average rating of {record.get('average_rating')} from {record.get('ratings_count')} ratings.")
+
+
+def books_corpus(books_path: str, out_dir: str, n_docs: int, per_doc: int, seed: int = 0) -> list:
+    """
+    Write n_docs text files of per_doc book descriptions sampled from books_path into out_dir
+    and return the sampled records (used to derive queries). Deterministic for a given seed.
+    """
+    with open(books_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(records), size=n_docs * per_doc, replace=n_docs * per_doc > len(records))
+    os.makedirs(out_dir, exist_ok=True)
+    for doc in range(n_docs):
+        rows = [records[i] for i in picks[doc * per_doc:(doc + 1) * per_doc]]
+        with open(os.path.join(out_dir, f"books-{doc:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(book_text(r) for r in rows))
+    print(f"[INFO] Generated {n_docs} synthetic documents ({n_docs * per_doc} book records) in {out_dir}")
+    return [records[i] for i in picks]
+
+
+def book_queries(records: list, n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for i in rng.choice(len(records), size=n, replace=n > len(records)):
+        record = records[i]
+        template = BOOK_QUERY_TEMPLATES[len(queries) % len(BOOK_QUERY_TEMPLATES)]
+        queries.append(template.format(title=record["title"], year=record.get("publication_year"),
+                                       author=(record.get("authors") or ["unknown"])[0]))
+    return queries
+
+
+def bench_ingestion(data_dir: str, pipeline) -> tuple:
+    """Parse and chunk data_dir; returns (metrics, chunks)."""
+    from src.data_loader import list_supported_files, iter_file_documents
+    start = time.perf_counter()
+    files = list_supported_files(data_dir)
+    documents = list(iter_file_documents(files))
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    chunks = [chunk for batch in pipeline.iter_chunk_batches(documents) for chunk in batch]
+    chunk_s = time.perf_counter() - start
+    metrics = {"files": len(files), "documents": len(documents), "chunks": len(chunks),
+               "input_bytes": sum(os.path.getsize(p) for p in files),
+               "load_s": round(load_s, 3), "docs_per_sec": round(len(documents) / max(load_s, 1e-9), 1),
+               "chunk_s": round(chunk_s, 3), "chunks_per_sec": round(len(chunks) / max(chunk_s, 1e-9), 1)}
+    return metrics, chunks
+
+
+def bench_embedding(pipeline, chunks: list) -> dict:
+    """Cold embedding throughput: the pipeline's cache is empty, so every chunk is encoded."""
+    start = time.perf_counter()
+    pipeline.embed_chunks(chunks)
+    embed_s = time.perf_counter() - start
+    return {"embed_s": round(embed_s, 3), "embed_chunks_per_sec": round(len(chunks) / max(embed_s, 1e-9), 1),
+            "workers": pipeline.engine.workers}
+
+
+def bench_build(data_dir: str, store_dir: str, model: str, index_type: str, embedding_cache) -> tuple:
+    """
+    Build a store from data_dir; returns (metrics, store). The embedding cache is warm from
+    bench_embedding, so build_s is parsing + chunking + index training/adds + persistence.
+    """
+    from src.vectorstore import FaissVectorStore
+    store = FaissVectorStore(store_dir, model, index_type=index_type, embedding_cache=embedding_cache)
+    start = time.perf_counter()
+    store.update_from_directory(data_dir)
+    build_s = time.perf_counter() - start
+    metrics = {"build_s": round(build_s, 3), "vectors": int(store.index.ntotal),
+               "index_bytes": int(faiss.serialize_index(store.index).size), "store_disk_bytes": dir_bytes(store_dir)}
+    return metrics, store
+
+
+def bench_recall(store, embedding_cache, queries: list, top_k: int) -> dict:
+    """recall@k of the store's index against an exact search over the same chunk vectors."""
+    from src.embedding_cache import chunk_hash
+    from src.index_factory import prepare_vectors
+    ids = np.asarray(store.chunks.ids(), dtype='int64')
+    texts = [meta["text"] for meta in store.chunks.get_many(ids)]
+    vectors = prepare_vectors(store.index_config, np.vstack(embedding_cache.get_many([chunk_hash(t) for t in texts])))
+    cosine = store.index_config["params"]["metric"] == "cosine"
+    exact = faiss.IndexIDMap(faiss.IndexFlatIP(vectors.shape[1]) if cosine else faiss.IndexFlatL2(vectors.shape[1]))
+    exact.add_with_ids(vectors, ids)
+    query_embs = store.embed_queries(queries)
+    k = min(top_k, len(ids))
+    _, truth = exact.search(prepare_vectors(store.index_config, query_embs), k)
+    found = [[r["index"] for r in results] for results in store.search_batch(query_embs, top_k=k)]
+    return {f"recall@{top_k}": round(recall_at_k(found, truth), 4)}
+
+
+def bench_queries(rag, queries: list, n_retrievals: int, n_answers: int, top_k: int) -> dict:
+    """Latency percentiles of hybrid retrieval and of full answers from the fake LLM."""
+    # Numbered query texts keep the query embedding cache from hiding encode cost
+    rag.retrieve("warm up", top_k=top_k)
+    retrieval = []
+    for i in range(n_retrievals):
+        start = time.perf_counter()
+        rag.retrieve(f"{queries[i % len(queries)]} ({i})", top_k=top_k)
+        retrieval.append(time.perf_counter() - start)
+    answers = []
+    for i in range(n_answers):
+        start = time.perf_counter()
+        rag.search_and_summarize(f"{queries[i % len(queries)]} [{i}]", top_k=top_k)
+        answers.append(time.perf_counter() - start)
+    metrics = {f"retrieve_{key}": value for key, value in percentiles(retrieval).items()}
+    if answers:
+        metrics.update({f"answer_{key}": value for key, value in percentiles(answers).items()})
+    return metrics
+
+
+def run_corpus(name: str, data_dir: str, queries: list, workdir: str, args) -> dict:
+    from src.cache import SemanticAnswerCache
+    from src.embedding import EmbeddingPipeline
+    from src.embedding_cache import EmbeddingCache
+    from src.search import RAGSearch
+    print(f"[INFO] === Benchmarking corpus '{name}' ({data_dir}) ===")
+    embedding_cache = EmbeddingCache(os.path.join(workdir, name, "embedding_cache"), args.model)
+    pipeline = EmbeddingPipeline(model_name=args.model, embedding_cache=embedding_cache)
+    results = {"data_dir": data_dir}
+    ingestion, chunks = bench_ingestion(data_dir, pipeline)
+    results.update(ingestion)
+    if not chunks:
+        print(f"[WARNING] Corpus '{name}' produced no chunks, skipping the remaining stages.")
+        return results
+    results.update(bench_embedding(pipeline, chunks))
+    store_dir = os.path.join(workdir, name, "store")
+    build, store = bench_build(data_dir, store_dir, args.model, args.index_type, embedding_cache)
+    results.update(build)
+    results.update(bench_recall(store, embedding_cache, queries, args.top_k))
+    store.close()
+    # A threshold above 1 can never match, which disables answer caching
+    rag = RAGSearch(persist_dir=store_dir, embedding_model=args.model, answer_cache=SemanticAnswerCache(similarity_threshold=1.1))
+    results.update(bench_queries(rag, queries, args.retrievals, args.answers, args.top_k))
+    rag.vectorstore.close()
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(old: dict, new: dict, tolerance: float) -> int:
+    """Print per-metric changes between two result files; returns the number of regressions beyond tolerance."""
+    regressions = 0
+    print(f"[INFO] {old['commit'] or '?'} -> {new['commit'] or '?'}")
+    if old["config"] != new["config"]:
+        print("[WARNING] The runs used different settings; changes may not be regressions.")
+    for name in sorted(set(old["corpora"]) & set(new["corpora"])):
+        before, after = old["corpora"][name], new["corpora"][name]
+        print(f"\n{name}")
+        for key in sorted(set(before) & set(after)):
+            a, b = before[key], after[key]
+            if isinstance(a, bool) or not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or a == 0:
+                continue
+            change = (b - a) / abs(a)
+            worse = -change if any(marker in key for marker in HIGHER_IS_BETTER) else change
+            flag = "  REGRESSION" if worse > tolerance and key not in WORKLOAD_KEYS else ""
+            regressions += bool(flag)
+            print(f"  {key:<26}{a:>14}{b:>14}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=("data", "books"), nargs="+", default=["data", "books"])
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--books", default="books.jsonl", help="records the synthetic corpus is generated from")
+    parser.add_argument("--books-docs", type=int, default=500, help="synthetic documents to generate")
+    parser.add_argument("--books-per-doc", type=int, default=20, help="book records per synthetic document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100, help="distinct queries for recall and latency")
+    parser.add_argument("--retrievals", type=int, default=200, help="timed retrievals per corpus")
+    parser.add_argument("--answers", type=int, default=20, help="timed answers (fake LLM) per corpus")
+    parser.add_argument("--ttft", type=float, default=0.05, help="fake LLM time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--workdir", help="keep stores and the generated corpus here instead of a temp dir")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            sys.exit(1 if compare(json.load(f_old), json.load(f_new), args.tolerance) else 0)
+
+    server, url = start_server(ttft=args.ttft, token_delay=args.token_delay, n_tokens=args.tokens)
+    os.environ["GROQ_API_BASE"] = url
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    # Persisted query embeddings would turn encode cost into disk lookups
+    os.environ.pop("RAG_QUERY_CACHE_PATH", None)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    # Anything that falls back to the default embedding cache stays out of ./embedding_cache
+    os.environ["RAG_EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "default_embedding_cache")
+
+    report = {**git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "faiss": faiss.__version__, "cpu_count": os.cpu_count(),
+              "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare", "workdir")}, "corpora": {}}
+    try:
+        if "data" in args.corpus:
+            queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+            report["corpora"]["data"] = run_corpus("data", args.data_dir, queries, workdir, args)
+        if "books" in args.corpus:
+            books_dir = os.path.join(workdir, "books", "corpus")
+            records = books_corpus(args.books, books_dir, args.books_docs, args.books_per_doc, args.seed)
+            report["corpora"]["books"] = run_corpus("books", books_dir, book_queries(records, args.queries, args.seed), workdir, args)
+    finally:
+        server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, results in report["corpora"].items():
+        print(f"\n{name}")
+        for key, value in results.items():
+            print(f"  {key:<26}{value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# Seconds query() waits for its batch before giving up
+QUERY_TIMEOUT = 60.0
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent FaissVectorStore queries. Requests arriving within max_wait
+    seconds of each other (up to max_batch) are encoded in one model call and searched
+    with one batched index.search, then results are fanned back out to each caller.
+    After close() (e.g. when RAGSearch swaps in a new store while requests still hold the
+    old one), queries run inline on the caller's thread.
+    """
+    def __init__(self, store: Any, max_batch: int = 32, max_wait: float = 0.005):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = self.requests = 0
+
+    def submit(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filter: Optional[Dict[str, Any]] = None) -> Future:
+        """Queue a query; the future resolves to (query embedding, results)."""
+        future = Future()
+        item = (query_text, top_k, (nprobe, ef_search, filter), future)
+        with self._lock:
+            # Queued under the lock, so every item lands ahead of close()'s sentinel
+            if not self._closed:
+                self._ensure_worker()
+                self._queue.put(item)
+                return future
+        self._process_safely([item])
+        return future
+
+    def query(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+              filter: Optional[Dict[str, Any]] = None, timeout: Optional[float] = QUERY_TIMEOUT) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        return self.submit(query_text, top_k, nprobe, ef_search, filter).result(timeout=timeout)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _ensure_worker(self):
+        """Start the worker thread; callers hold self._lock."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect(self, first) -> List[tuple]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            self.batches += 1
+            self.requests += len(batch)
+            self._process_safely(batch)
+        # Anything still queued behind the sentinel is served rather than left hanging
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            self._process_safely(leftover)
+
+    def _process_safely(self, batch: List[tuple]):
+        try:
+            self._process(batch)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _process(self, batch: List[tuple]):
+        embeddings = self.store.embed_queries([item[0] for item in batch])
+        # Requests with the same search knobs and filter share one index.search call
+        groups = defaultdict(list)
+        for row, (_, _, options, _) in enumerate(batch):
+            groups[json.dumps(options, sort_keys=True, default=str)].append(row)
+        for rows in groups.values():
+            nprobe, ef_search, filter = batch[rows[0]][2]
+            top_k = max(batch[row][1] for row in rows)
+            results = self.store.search_batch(embeddings[rows], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+            for row, hits in zip(rows, results):
+                batch[row][3].set_result((embeddings[row], hits[:batch[row][1]]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batches": self.batches, "requests": self.requests,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0}
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import numpy as np
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+VOCAB_FILE = "bm25_vocab.json"
+POSTINGS_FILE = "bm25_postings.npz"
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over the same chunk ids as the Faiss index.
+    Persisted postings are CSR-style arrays (term offsets into flat doc id / term
+    frequency arrays). Document lengths are an int array indexed by chunk id (-1 where
+    there is no document), so scoring gathers them with one indexing operation and sums
+    into a dense per-id accumulator. Additions go to an in-memory delta and deletions
+    only clear the document's length; save() merges both back into compact arrays.
+    """
+    def __init__(self, persist_dir: str, k1: float = 1.5, b: float = 0.75):
+        self.vocab_path = os.path.join(persist_dir, VOCAB_FILE)
+        self.postings_path = os.path.join(persist_dir, POSTINGS_FILE)
+        self.k1 = k1
+        self.b = b
+        self.reset()
+
+    def reset(self):
+        self.terms: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype='int64')
+        self.post_ids = np.zeros(0, dtype='int64')
+        self.post_tfs = np.zeros(0, dtype='int32')
+        self.doc_lens = np.full(0, -1, dtype='int32')
+        self._delta: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._n_docs = 0
+        self._total_len = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.vocab_path) and os.path.exists(self.postings_path)
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def _grow(self, max_id: int):
+        if max_id >= len(self.doc_lens):
+            grown = np.full(max(max_id + 1, 2 * len(self.doc_lens)), -1, dtype='int32')
+            grown[:len(self.doc_lens)] = self.doc_lens
+            self.doc_lens = grown
+
+    def add(self, ids: Iterable[int], texts: Iterable[str]):
+        for doc_id, text in zip(ids, texts):
+            doc_id = int(doc_id)
+            counts = Counter(tokenize(text))
+            self._grow(doc_id)
+            if self.doc_lens[doc_id] >= 0:
+                self._total_len -= int(self.doc_lens[doc_id])
+            else:
+                self._n_docs += 1
+            self.doc_lens[doc_id] = sum(counts.values())
+            self._total_len += int(self.doc_lens[doc_id])
+            for term, tf in counts.items():
+                self._delta[term].append((doc_id, tf))
+
+    def remove(self, ids: Iterable[int]):
+        for doc_id in ids:
+            doc_id = int(doc_id)
+            if doc_id < len(self.doc_lens) and self.doc_lens[doc_id] >= 0:
+                self._total_len -= int(self.doc_lens[doc_id])
+                self._n_docs -= 1
+                self.doc_lens[doc_id] = -1
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        ids, tfs = [], []
+        term_id = self.terms.get(term)
+        if term_id is not None:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            ids.append(self.post_ids[start:end])
+            tfs.append(self.post_tfs[start:end])
+        delta = self._delta.get(term)
+        if delta:
+            ids.append(np.array([d for d, _ in delta], dtype='int64'))
+            tfs.append(np.array([t for _, t in delta], dtype='int32'))
+        if not ids:
+            return self.post_ids[:0], self.post_tfs[:0]
+        ids, tfs = np.concatenate(ids), np.concatenate(tfs)
+        # Postings of removed documents stay in the arrays until save(); their length is -1
+        live = self.doc_lens[ids] >= 0
+        if not live.all():
+            ids, tfs = ids[live], tfs[live]
+        return ids, tfs
+
+    def search(self, query: str, top_k: int = 5, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (chunk id, BM25 score) pairs, best first, optionally only among allowed_ids."""
+        n_docs = self._n_docs
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs
+        scores = np.zeros(len(self.doc_lens), dtype='float64')
+        for term in set(tokenize(query)):
+            ids, tfs = self._postings(term)
+            if not len(ids):
+                continue
+            idf = np.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            tf = tfs.astype('float64')
+            lens = self.doc_lens[ids]
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lens / avg_len))
+        if allowed_ids is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed_ids = np.asarray(allowed_ids, dtype='int64')
+            allowed[allowed_ids[(allowed_ids >= 0) & (allowed_ids < len(scores))]] = True
+            scores[~allowed] = 0
+        # BM25 scores of matching documents are positive
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = np.sort(matched[np.argpartition(-scores[matched], top_k)[:top_k]])
+        top = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self):
+        """Merge the delta and tombstones into compact CSR arrays and write them out."""
+        merged_terms = sorted(set(self.terms) | set(self._delta))
+        offsets, id_parts, tf_parts = [0], [], []
+        kept_terms = []
+        for term in merged_terms:
+            ids, tfs = self._postings(term)
+            if not len(ids):
+                continue
+            order = np.argsort(ids, kind='stable')
+            id_parts.append(ids[order])
+            tf_parts.append(tfs[order])
+            offsets.append(offsets[-1] + len(ids))
+            kept_terms.append(term)
+        self.terms = {term: i for i, term in enumerate(kept_terms)}
+        self.offsets = np.array(offsets, dtype='int64')
+        self.post_ids = np.concatenate(id_parts) if id_parts else np.zeros(0, dtype='int64')
+        self.post_tfs = np.concatenate(tf_parts).astype('int32') if tf_parts else np.zeros(0, dtype='int32')
+        self._delta = defaultdict(list)
+        live = np.flatnonzero(self.doc_lens >= 0)
+        self.doc_lens = self.doc_lens[:live[-1] + 1 if len(live) else 0].copy()
+
+        tmp_postings = self.postings_path + ".tmp.npz"
+        np.savez(tmp_postings, offsets=self.offsets, post_ids=self.post_ids, post_tfs=self.post_tfs,
+                 doc_lens=self.doc_lens)
+        tmp_vocab = self.vocab_path + ".tmp"
+        with open(tmp_vocab, "w", encoding="utf-8") as f:
+            json.dump(kept_terms, f, ensure_ascii=False)
+        os.replace(tmp_postings, self.postings_path)
+        os.replace(tmp_vocab, self.vocab_path)
+
+    def load(self):
+        self.reset()
+        with open(self.vocab_path, "r", encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        with np.load(self.postings_path) as data:
+            self.offsets = data["offsets"]
+            self.post_ids = data["post_ids"]
+            self.post_tfs = data["post_tfs"]
+            if "doc_ids" in data.files:
+                # Indexes saved before lengths were stored densely: (doc_ids, doc_lens) pairs
+                doc_ids = data["doc_ids"]
+                self.doc_lens = np.full(int(doc_ids.max()) + 1 if len(doc_ids) else 0, -1, dtype='int32')
+                self.doc_lens[doc_ids] = data["doc_lens"]
+            else:
+                self.doc_lens = data["doc_lens"].astype('int32')
+        live = self.doc_lens >= 0
+        self._n_docs = int(live.sum())
+        self._total_len = int(self.doc_lens[live].sum())
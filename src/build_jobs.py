@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from typing import Any, Dict, Optional
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+# Versions kept on disk: the live one plus the previous, which open readers may still map
+KEEP_VERSIONS = 2
+
+_jobs: Dict[str, threading.Thread] = {}
+_jobs_lock = threading.Lock()
+
+
+def versions_dir(live_dir: str) -> str:
+    return os.path.abspath(live_dir) + ".versions"
+
+
+def job_state_path(live_dir: str) -> str:
+    return os.path.abspath(live_dir) + ".build.json"
+
+
+def _write_state(live_dir: str, state: Dict[str, Any]):
+    state["updated"] = time.time()
+    path = job_state_path(live_dir)
+    # Per-thread temp file: the UI thread and the build thread may both write
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _is_alive(live_dir: str, pid: int) -> bool:
+    if pid == os.getpid():
+        thread = _jobs.get(os.path.abspath(live_dir))
+        # A thread that hasn't started yet counts as alive
+        return thread is not None and (thread.ident is None or thread.is_alive())
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def read_job_state(live_dir: str = "faiss_store") -> Optional[Dict[str, Any]]:
+    """
+    State of the latest build of live_dir, or None if it was never built in the background.
+    Keys: job_id, status ("running", "done" or "failed"), files_done, files_total,
+    chunks_done, chunks_per_sec, changes and embedding_cache stats (when done), error (when failed).
+    """
+    path = job_state_path(live_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state["status"] == "running" and not _is_alive(live_dir, state["pid"]):
+        state.update(status="failed", error="build worker exited unexpectedly")
+    return state
+
+
+def swap_live(live_dir: str, version_dir: str):
+    """
+    Atomically repoint live_dir, a symlink, at version_dir. A live_dir that is still a
+    plain directory (stores built before versioning) is first moved into the versions dir.
+    """
+    live_dir = os.path.abspath(live_dir)
+    if os.path.isdir(live_dir) and not os.path.islink(live_dir):
+        os.makedirs(versions_dir(live_dir), exist_ok=True)
+        os.rename(live_dir, os.path.join(versions_dir(live_dir), time.strftime("%Y%m%d-%H%M%S") + "-legacy"))
+    tmp_link = f"{live_dir}.tmp-{uuid.uuid4().hex[:8]}"
+    os.symlink(os.path.relpath(version_dir, os.path.dirname(live_dir)), tmp_link)
+    os.replace(tmp_link, live_dir)
+
+
+def _prune_versions(live_dir: str):
+    root = versions_dir(live_dir)
+    current = os.path.realpath(live_dir)
+    # Version names start with their creation time, so they sort oldest first
+    old = [os.path.join(root, name) for name in sorted(os.listdir(root)) if os.path.join(root, name) != current]
+    for path in old[:max(len(old) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _run_build(live_dir: str, state: Dict[str, Any], store_kwargs: Dict[str, Any]):
+    from src.sharded_store import open_vector_store, store_exists
+    version_dir = state["version_dir"]
+    try:
+        os.makedirs(versions_dir(live_dir), exist_ok=True)
+        # Start from a copy of the live store so only new or changed files are embedded
+        if store_exists(live_dir):
+            shutil.copytree(os.path.realpath(live_dir), version_dir)
+
+        def progress(event: Dict[str, Any]):
+            state.update(event)
+            _write_state(live_dir, state)
+
+        store = open_vector_store(version_dir, **store_kwargs)
+        changes = store.update_from_directory(state["data_dir"], progress=progress)
+        store.close()
+        swap_live(live_dir, version_dir)
+        _prune_versions(live_dir)
+        state.update(status="done", changes=changes, embedding_cache=store.pipeline.cache.stats(), finished=time.time())
+        logger.info(f"Build {state['job_id']} is live at {live_dir}.")
+    except Exception as e:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        state.update(status="failed", error=str(e), finished=time.time())
+        logger.error(f"Build {state['job_id']} failed: {e}")
+    _write_state(live_dir, state)
+
+
+def start_build(data_dir: str = "data", live_dir: str = "faiss_store", **store_kwargs) -> Dict[str, Any]:
+    """
+    Sync live_dir with data_dir on a background thread and return the job state.
+    The new version is built in its own directory and swapped in atomically when done,
+    so readers never see a half-built store. If a build is already running, its state
+    is returned instead of starting another. store_kwargs go to open_vector_store
+    (e.g. n_shards=4 for a sharded store, plus reshard=True to change an existing store's count).
+    """
+    with _jobs_lock:
+        state = read_job_state(live_dir)
+        if state is not None and state["status"] == "running":
+            return state
+        job_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        state = {"job_id": job_id, "status": "running", "pid": os.getpid(), "data_dir": data_dir,
+                 "version_dir": os.path.join(versions_dir(live_dir), job_id), "started": time.time(),
+                 "files_done": 0, "files_total": 0, "chunks_done": 0, "chunks_per_sec": 0.0}
+        thread = threading.Thread(target=_run_build, args=(live_dir, state, store_kwargs), name=f"index-build-{job_id}", daemon=True)
+        _jobs[os.path.abspath(live_dir)] = thread
+        _write_state(live_dir, state)
+        thread.start()
+    logger.info(f"Started build {job_id} of {data_dir} into {live_dir}.")
+    return state
+
+
+def wait_for_build(live_dir: str = "faiss_store", poll_interval: float = 1.0) -> Optional[Dict[str, Any]]:
+    """Block until the current build of live_dir finishes and return its final state."""
+    state = read_job_state(live_dir)
+    while state is not None and state["status"] == "running":
+        time.sleep(poll_interval)
+        state = read_job_state(live_dir)
+    return state
+
+
+# Example usage
+if __name__ == "__main__":
+    start_build("data", "faiss_store")
+    print(wait_for_build("faiss_store"))
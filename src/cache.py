@@ -0,0 +1,221 @@
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and (optionally) total bytes,
+    with an optional time-to-live per entry. Tracks hits, misses and evictions.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: getattr(value, "nbytes", 0))
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[1] > self.ttl):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or
+                                  (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key: Hashable):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace so trivially different spellings of a query share a cache entry."""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by (model name, normalized query text),
+    optionally backed by an SQLite file so entries survive restarts.
+    """
+    def __init__(self, max_entries: int = 4096, max_bytes: Optional[int] = 32 * 1024 * 1024, ttl: Optional[float] = None,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 100000):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.disk_hits = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS query_embeddings "
+                             "(model TEXT, query TEXT, created REAL, dtype TEXT, vector BLOB, PRIMARY KEY (model, query))")
+            self._db.commit()
+
+    def _disk_get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        with self._db_lock:
+            row = self._db.execute("SELECT created, dtype, vector FROM query_embeddings WHERE model = ? AND query = ?",
+                                   (model_name, query)).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[0] > self.ttl):
+            return None
+        return np.frombuffer(row[2], dtype=row[1])
+
+    def _disk_put(self, model_name: str, queries: List[str], vectors: np.ndarray):
+        now = time.time()
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?, ?)",
+                                 [(model_name, q, now, str(v.dtype), v.tobytes()) for q, v in zip(queries, vectors)])
+            # Keep the disk store bounded too, dropping the oldest entries first
+            self._db.execute("DELETE FROM query_embeddings WHERE rowid IN (SELECT rowid FROM query_embeddings "
+                             "ORDER BY created LIMIT max(0, (SELECT count(*) FROM query_embeddings) - ?))",
+                             (self.disk_max_entries,))
+            self._db.commit()
+
+    def encode(self, model_name: str, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for texts, calling encode_fn only for queries not already cached."""
+        queries = [normalize_query(t) for t in texts]
+        vectors: List[Optional[np.ndarray]] = [self.memory.get((model_name, q)) for q in queries]
+        if self._db is not None:
+            for i, q in enumerate(queries):
+                if vectors[i] is None:
+                    vectors[i] = self._disk_get(model_name, q)
+                    if vectors[i] is not None:
+                        self.disk_hits += 1
+                        self.memory.put((model_name, q), vectors[i])
+        missing = sorted({q for q, v in zip(queries, vectors) if v is None})
+        if missing:
+            encoded = np.asarray(encode_fn(missing), dtype='float32')
+            fresh = dict(zip(missing, encoded))
+            for q, v in fresh.items():
+                self.memory.put((model_name, q), v)
+            if self._db is not None:
+                self._disk_put(model_name, missing, encoded)
+            vectors = [fresh[q] if v is None else v for q, v in zip(queries, vectors)]
+        return np.vstack(vectors).astype('float32')
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.memory.stats(), "disk_hits": self.disk_hits}
+
+    def clear(self):
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM query_embeddings")
+                self._db.commit()
+
+
+_default_query_cache: Optional[QueryEmbeddingCache] = None
+_default_lock = threading.Lock()
+
+
+def default_query_cache() -> QueryEmbeddingCache:
+    """Process-wide query cache; set RAG_QUERY_CACHE_PATH to persist it on disk."""
+    global _default_query_cache
+    with _default_lock:
+        if _default_query_cache is None:
+            _default_query_cache = QueryEmbeddingCache(disk_path=os.getenv("RAG_QUERY_CACHE_PATH") or None)
+    return _default_query_cache
+
+
+class SemanticAnswerCache:
+    """
+    Cache of LLM answers for RAGSearch. A stored answer is reused when a new query
+    retrieved exactly the same chunks (from the same store build, for the same LLM)
+    and its embedding has cosine similarity >= threshold with the cached query.
+    Keys include the store's build id, so answers from before a rebuild are never served.
+    """
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 1024, per_key: int = 8,
+                 ttl: Optional[float] = None):
+        self.similarity_threshold = similarity_threshold
+        self.per_key = per_key
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl, sizeof=lambda bucket: 0)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _key(build_id: str, llm_model: str, chunk_ids: List[int]) -> Hashable:
+        return (build_id, llm_model, tuple(int(i) for i in chunk_ids))
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32').ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, build_id: str, llm_model: str, chunk_ids: List[int], query_vector: np.ndarray) -> Optional[str]:
+        bucket = self.entries.get(self._key(build_id, llm_model, chunk_ids)) or []
+        query_vector = self._unit(query_vector)
+        with self._lock:
+            for vector, answer, latency in bucket:
+                if float(vector @ query_vector) >= self.similarity_threshold:
+                    self.hits += 1
+                    self.saved_seconds += latency
+                    return answer
+            self.misses += 1
+        return None
+
+    def put(self, build_id: str, llm_model: str, chunk_ids: List[int], query_vector: np.ndarray, answer: str, latency: float):
+        key = self._key(build_id, llm_model, chunk_ids)
+        with self._lock:
+            bucket = list(self.entries.get(key) or [])
+            bucket.append((self._unit(query_vector), answer, latency))
+            self.entries.put(key, bucket[-self.per_key:])
+
+    def invalidate(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "saved_seconds": round(self.saved_seconds, 3)}
+
+
+_default_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def default_answer_cache() -> SemanticAnswerCache:
+    """Process-wide answer cache shared by every RAGSearch (e.g. all Streamlit sessions)."""
+    global _default_answer_cache
+    with _default_lock:
+        if _default_answer_cache is None:
+            _default_answer_cache = SemanticAnswerCache()
+    return _default_answer_cache
@@ -0,0 +1,149 @@
+import os
+import json
+import mmap
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+BLOB_FILE = "chunks.bin"
+INDEX_FILE = "chunks.idx.npy"
+
+# Rewrite the blob once less than this fraction of it belongs to live chunks
+COMPACT_RATIO = 0.5
+
+
+class ChunkStore:
+    """
+    Memory-mapped chunk metadata store.
+    chunks.bin is a contiguous blob of UTF-8 JSON records; chunks.idx.npy is an
+    (n, 3) int64 array of (vector id, offset, length) rows sorted by id.
+    Both files are opened with mmap, so loading is near-constant time, only the rows
+    that are looked up get paged in, and processes share pages through the OS cache.
+    Updates are buffered in memory and appended to the blob on flush(); rewrites (reset,
+    compaction) go to a new file that replaces the blob, so existing mappings stay valid.
+    """
+    def __init__(self, persist_dir: str):
+        self.blob_path = os.path.join(persist_dir, BLOB_FILE)
+        self.index_path = os.path.join(persist_dir, INDEX_FILE)
+        self._rows = np.zeros((0, 3), dtype='int64')
+        self._blob = None
+        self._blob_file = None
+        self._pending: Dict[int, bytes] = {}
+        self._deleted = set()
+        self._truncate = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path) and os.path.exists(self.blob_path)
+
+    def open(self):
+        self.close()
+        self._rows = np.load(self.index_path, mmap_mode='r')
+        self._blob_file = open(self.blob_path, "rb")
+        if os.fstat(self._blob_file.fileno()).st_size > 0:
+            self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pending, self._deleted, self._truncate = {}, set(), False
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        if self._blob_file is not None:
+            self._blob_file.close()
+            self._blob_file = None
+        self._rows = np.zeros((0, 3), dtype='int64')
+
+    def reset(self):
+        self.close()
+        self._pending, self._deleted, self._truncate = {}, set(), True
+
+    def __len__(self) -> int:
+        stale = np.isin(self._rows[:, 0], list(self._deleted | set(self._pending))).sum() if len(self._rows) else 0
+        return len(self._rows) - int(stale) + len(self._pending)
+
+    def add(self, ids: Iterable[int], metadatas: Iterable[Any]):
+        for vec_id, meta in zip(ids, metadatas):
+            vec_id = int(vec_id)
+            self._deleted.discard(vec_id)
+            self._pending[vec_id] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    def remove(self, ids: Iterable[int]):
+        for vec_id in ids:
+            vec_id = int(vec_id)
+            self._pending.pop(vec_id, None)
+            self._deleted.add(vec_id)
+
+    def get(self, vec_id: int) -> Optional[Any]:
+        vec_id = int(vec_id)
+        if vec_id in self._pending:
+            return json.loads(self._pending[vec_id])
+        if vec_id in self._deleted or not len(self._rows):
+            return None
+        pos = np.searchsorted(self._rows[:, 0], vec_id)
+        if pos >= len(self._rows) or self._rows[pos, 0] != vec_id:
+            return None
+        _, offset, length = (int(v) for v in self._rows[pos])
+        return json.loads(self._blob[offset:offset + length])
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Any]]:
+        return [self.get(vec_id) for vec_id in ids]
+
+    def ids(self) -> List[int]:
+        """All live chunk ids, in ascending order."""
+        persisted = [i for i in self._rows[:, 0].tolist() if i not in self._deleted] if len(self._rows) else []
+        return sorted(set(persisted) | set(self._pending))
+
+    def flush(self):
+        """Append pending chunks to the blob and atomically replace the offsets array."""
+        rows = np.array(self._rows)
+        if len(rows):
+            dropped = np.isin(rows[:, 0], list(self._deleted | set(self._pending)))
+            rows = rows[~dropped]
+        blob_size = 0 if self._truncate or not os.path.exists(self.blob_path) else os.path.getsize(self.blob_path)
+        live_bytes = int(rows[:, 2].sum()) if len(rows) else 0
+        if blob_size and live_bytes < COMPACT_RATIO * blob_size:
+            rows, blob_size = self._compact(rows)
+
+        new_rows = []
+        # Appends leave existing bytes in place; a fresh blob is written aside and renamed,
+        # since truncating the file would invalidate other processes' mappings (SIGBUS)
+        rewrite = self._truncate or not blob_size
+        path = self.blob_path + ".tmp" if rewrite else self.blob_path
+        with open(path, "wb" if rewrite else "ab") as f:
+            for vec_id in sorted(self._pending):
+                data = self._pending[vec_id]
+                f.write(data)
+                new_rows.append((vec_id, blob_size, len(data)))
+                blob_size += len(data)
+            if rewrite:
+                f.flush()
+                os.fsync(f.fileno())
+        if rewrite:
+            self.close()
+            os.replace(path, self.blob_path)
+        if new_rows:
+            rows = np.vstack([rows, np.array(new_rows, dtype='int64')])
+        rows = rows[np.argsort(rows[:, 0], kind='stable')] if len(rows) else np.zeros((0, 3), dtype='int64')
+
+        tmp_path = self.index_path + ".tmp.npy"
+        np.save(tmp_path, rows)
+        os.replace(tmp_path, self.index_path)
+        self.open()
+
+    def _compact(self, rows: np.ndarray):
+        """Rewrite the blob with only the live rows, returning the new rows and blob size."""
+        tmp_path = self.blob_path + ".tmp"
+        compacted = []
+        offset = 0
+        with open(tmp_path, "wb") as f:
+            for vec_id, old_offset, length in rows.tolist():
+                f.write(self._blob[old_offset:old_offset + length])
+                compacted.append((vec_id, offset, length))
+                offset += length
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_path, self.blob_path)
+        logger.info(f"Compacted chunk store to {offset} bytes.")
+        return np.array(compacted, dtype='int64').reshape(-1, 3), offset
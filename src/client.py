@@ -0,0 +1,84 @@
+import json
+import os
+import requests
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_SERVER_URL = "http://127.0.0.1:8000"
+
+
+def default_server_url() -> str:
+    return os.getenv("RAG_SERVER_URL") or DEFAULT_SERVER_URL
+
+
+class RAGClient:
+    """
+    Thin client for src.server. Mirrors the RAGSearch methods the UI uses, over one
+    keep-alive requests.Session. Use one client per thread.
+    """
+    def __init__(self, base_url: Optional[str] = None, llm_model: Optional[str] = None, timeout: float = 120.0):
+        self.base_url = (base_url or default_server_url()).rstrip("/")
+        self.llm_model = llm_model
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        response = self.session.post(self.base_url + path, json=payload, stream=stream, timeout=self.timeout)
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            raise RuntimeError(f"RAG server error {response.status_code}: {message}")
+        return response
+
+    def health(self) -> Dict[str, Any]:
+        response = self.session.get(self.base_url + "/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Server-side stage timings, counters and gauges (see src.metrics.Metrics.snapshot)."""
+        response = self.session.get(self.base_url + "/diagnostics", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def is_available(self) -> bool:
+        try:
+            self.health()
+            return True
+        except requests.RequestException:
+            return False
+
+    def search(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+               history: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        return self._post("/search", {"query": query, "top_k": top_k, "filter": filter, "history": history}).json()["results"]
+
+    def search_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                             history: Optional[List[Dict[str, Any]]] = None) -> str:
+        payload = {"query": query, "top_k": top_k, "filter": filter, "history": history, "llm_model": self.llm_model}
+        return self._post("/answer", payload).json()["answer"]
+
+    def stream_search_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                                    history: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        payload = {"query": query, "top_k": top_k, "filter": filter, "history": history, "llm_model": self.llm_model,
+                   "stream": True}
+        with self._post("/answer", payload, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise RuntimeError(f"RAG server error: {event['error']}")
+                yield event["token"]
+
+    def close(self):
+        self.session.close()
+
+
+# Example usage
+if __name__ == "__main__":
+    client = RAGClient()
+    print("Summary: ", end="", flush=True)
+    for token in client.stream_search_and_summarize("What is attention mechanism?", top_k=3):
+        print(token, end="", flush=True)
+    print()
@@ -0,0 +1,109 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Prompt-context token budgets per Groq model. These sit well under the context windows
+# and the free-tier per-request limits, leaving room for the question and the answer.
+MODEL_CONTEXT_BUDGETS = {
+    "llama-3.1-8b-instant": 3000,
+    "llama-3.3-70b-versatile": 6000,
+    "mixtral-8x7b-32768": 6000,
+}
+DEFAULT_CONTEXT_BUDGET = 4000
+
+# Overlaps shorter than this are treated as coincidence rather than splitter overlap
+MIN_OVERLAP_CHARS = 20
+# Chunks sharing at least this fraction of word 5-grams count as near-duplicates
+NEAR_DUPLICATE_JACCARD = 0.85
+
+WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for Llama-family tokenizers)."""
+    return (len(text) + 3) // 4
+
+
+def context_budget(llm_model: str) -> int:
+    return MODEL_CONTEXT_BUDGETS.get(llm_model, DEFAULT_CONTEXT_BUDGET)
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right (0 if below MIN_OVERLAP_CHARS)."""
+    for size in range(min(len(left), len(right), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str, n: int = 5) -> set:
+    words = WORD_RE.findall(text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def merge_passages(results: List[Dict[str, Any]], max_overlap: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Collapse retrieved chunks into passages, keeping the input (score) order.
+    Chunks from the same source whose ends overlap (as produced by the splitter's
+    chunk_overlap) are stitched together; contained and near-duplicate chunks are dropped.
+    Each passage is {"text", "source", "ids"}.
+    """
+    passages: List[Dict[str, Any]] = []
+    for result in results:
+        meta = result.get("metadata") or {}
+        text = meta.get("text", "").strip()
+        if not text:
+            continue
+        source = meta.get("source")
+        shingles = _shingles(text)
+        for passage in passages:
+            if passage["source"] != source:
+                continue
+            if text in passage["text"] or _jaccard(shingles, passage["shingles"]) >= NEAR_DUPLICATE_JACCARD:
+                passage["ids"].append(int(result["index"]))
+                break
+            tail = _overlap(passage["text"], text, max_overlap)
+            head = 0 if tail else _overlap(text, passage["text"], max_overlap)
+            if tail or head:
+                passage["text"] = passage["text"] + text[tail:] if tail else text + passage["text"][head:]
+                passage["shingles"] = _shingles(passage["text"])
+                passage["ids"].append(int(result["index"]))
+                break
+        else:
+            passages.append({"text": text, "source": source, "ids": [int(result["index"])], "shingles": shingles})
+    for passage in passages:
+        del passage["shingles"]
+    return passages
+
+
+def build_context(results: List[Dict[str, Any]], token_budget: int, count_tokens: Callable[[str], int] = estimate_tokens,
+                  separator: str = "\n\n") -> Tuple[str, List[int]]:
+    """
+    Merge and dedupe retrieved chunks, then pack passages in score order into token_budget.
+    Passages that don't fit are skipped in favour of later, smaller ones; if not even the
+    best passage fits, it is truncated. Returns (context, ids of chunks included).
+    """
+    parts, used_ids = [], []
+    remaining = token_budget
+    sep_tokens = count_tokens(separator)
+    for passage in merge_passages(results):
+        cost = count_tokens(passage["text"]) + (sep_tokens if parts else 0)
+        if cost <= remaining:
+            parts.append(passage["text"])
+            used_ids.extend(passage["ids"])
+            remaining -= cost
+        elif not parts:
+            # Truncate proportionally to the budget so the prompt is never empty
+            keep = int(len(passage["text"]) * remaining / max(cost, 1))
+            parts.append(passage["text"][:keep])
+            used_ids.extend(passage["ids"])
+            break
+    return separator.join(parts), used_ids
+
+
+def prompt_budget(total_budget: int, *fixed_texts: Optional[str], count_tokens: Callable[[str], int] = estimate_tokens) -> int:
+    """Context budget left once the fixed parts of the prompt are accounted for."""
+    return max(total_budget - sum(count_tokens(t) for t in fixed_texts if t), 0)
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+from src.bm25 import tokenize
+from src.cache import LRUCache, normalize_query
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+# Earlier user turns a follow-up may borrow search terms from
+REWRITE_TURNS = 2
+# Most terms the heuristic rewrite appends to a follow-up
+MAX_CONTEXT_TERMS = 8
+# With short_follow_ups enabled, questions this short count as follow-ups even without a referring word
+SHORT_QUERY_WORDS = 3
+# History messages (and characters of each assistant answer) shown to the rewrite model
+REWRITE_MESSAGES = 6
+ANSWER_EXCERPT_CHARS = 300
+
+STOPWORDS = frozenset("""
+a an the and or but if then so of to in on at by for with from into about as is are was were be been being
+do does did have has had can could should would will shall may might must i me my we our you your what which who
+whom whose when where why how not no yes please tell show give explain describe list any some all each there
+""".split())
+# Words that point back at something said earlier in the conversation
+FOLLOW_UP_WORDS = frozenset("""
+it its they them their theirs this that these those he him his she her hers same above previous former latter
+""".split())
+# Openers that continue the previous question (ellipsis)
+FOLLOW_UP_OPENERS = ("and ", "but ", "also ", "what about", "how about", "what else", "then ", "so ", "more ", "tell me more")
+
+REWRITE_PROMPT = ("Rewrite the last question of this conversation as a short standalone search query, "
+                  "replacing references like 'it' or 'that' with what they refer to. "
+                  "Reply with the query only.\n\nConversation:\n{conversation}\n\nLast question: {query}\n\nSearch query:")
+
+
+def user_turns(history: Optional[List[Dict[str, Any]]]) -> List[str]:
+    """The user messages of a chat history ({"role", "content"} dicts), oldest first."""
+    return [str(m.get("content", "")) for m in history or () if m.get("role") == "user" and m.get("content")]
+
+
+def is_follow_up(query: str, short_follow_ups: bool = False) -> bool:
+    """
+    Cheap check for questions that only make sense with the conversation before them: they
+    refer back ("it", "those") or continue it ("what about ...", "and ..."). Short keyword
+    queries like "pricing policy 2024" are standalone unless short_follow_ups is set.
+    """
+    words = tokenize(query)
+    return (any(word in FOLLOW_UP_WORDS for word in words) or normalize_query(query).lower().startswith(FOLLOW_UP_OPENERS)
+            or (short_follow_ups and len(words) <= SHORT_QUERY_WORDS))
+
+
+def heuristic_rewrite(query: str, history: Optional[List[Dict[str, Any]]]) -> str:
+    """query plus the content words of the most recent user turns, newest first."""
+    seen, terms = set(tokenize(query)), []
+    for question in reversed(user_turns(history)[-REWRITE_TURNS:]):
+        for word in tokenize(question):
+            if len(word) > 1 and word not in STOPWORDS and word not in FOLLOW_UP_WORDS and word not in seen:
+                seen.add(word)
+                terms.append(word)
+    return " ".join([query.strip()] + terms[:MAX_CONTEXT_TERMS])
+
+
+def conversation_key(questions: List[str]) -> str:
+    """Digest of a conversation's user turns; assistant answers don't change what was asked."""
+    return hashlib.sha1("\x1f".join(normalize_query(q) for q in questions).encode("utf-8")).hexdigest()
+
+
+def filter_key(filter: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(filter, sort_keys=True, default=str) if filter else ""
+
+
+class QueryRewriter:
+    """
+    Turns a chat question into a standalone retrieval query, so the embedding query is
+    the question (plus what it refers to) rather than the whole transcript.
+    Self-contained questions pass through unchanged. Follow-ups get heuristic_rewrite, or,
+    with llm_model set, a rewrite by that (fast) Groq model, falling back to the heuristic
+    if the call fails. Rewrites are cached per conversation turn. short_follow_ups: see is_follow_up.
+    """
+    def __init__(self, llm_model: Optional[str] = None, cache_size: int = 1024, short_follow_ups: bool = False):
+        self.llm_model = llm_model
+        self.short_follow_ups = short_follow_ups
+        self.cache = LRUCache(max_entries=cache_size)
+        self._llm = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            self._llm = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name=self.llm_model, temperature=0)
+        return self._llm
+
+    def _conversation(self, history: List[Dict[str, Any]]) -> str:
+        lines = []
+        for message in history[-REWRITE_MESSAGES:]:
+            content = " ".join(str(message.get("content", "")).split())
+            if message.get("role") == "user":
+                lines.append(f"User: {content}")
+            else:
+                lines.append(f"Assistant: {content[:ANSWER_EXCERPT_CHARS]}")
+        return "\n".join(lines)
+
+    def is_follow_up(self, query: str) -> bool:
+        return is_follow_up(query, short_follow_ups=self.short_follow_ups)
+
+    def rewrite(self, query: str, history: Optional[List[Dict[str, Any]]]) -> str:
+        if not user_turns(history) or not self.is_follow_up(query):
+            return query
+        key = conversation_key(user_turns(history) + [query])
+        rewritten = self.cache.get(key)
+        if rewritten is not None:
+            return rewritten
+        rewritten = None
+        if self.llm_model:
+            try:
+                prompt = REWRITE_PROMPT.format(conversation=self._conversation(history), query=query)
+                rewritten = " ".join(self.llm.invoke([prompt]).content.strip().strip('"').split()) or None
+            except Exception as e:
+                logger.warning(f"Query rewrite with {self.llm_model} failed, using the heuristic: {e}")
+        rewritten = rewritten or heuristic_rewrite(query, history)
+        logger.debug("Rewrote follow-up '%s' as '%s'", query, rewritten)
+        self.cache.put(key, rewritten)
+        return rewritten
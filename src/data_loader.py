@@ -1,103 +1,183 @@
+import os
+import csv
+import json
+import importlib
+import multiprocessing
 from pathlib import Path
-from typing import List, Any
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, CSVLoader
-from langchain_community.document_loaders import Docx2txtLoader
-from langchain_community.document_loaders.excel import UnstructuredExcelLoader
-from langchain_community.document_loaders import JSONLoader
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Set, Tuple
+from src.log import get_logger
 
-def load_all_documents(data_dir: str) -> List[Any]:
+logger = get_logger(__name__)
+
+# File extension -> LangChain loader class, or "module:Class" to import the first time
+# such a file is loaded (langchain_community and the parsers behind it are slow to import)
+LOADERS = {
+    ".pdf": "langchain_community.document_loaders:PyPDFLoader",
+    ".txt": "langchain_community.document_loaders:TextLoader",
+    ".csv": "langchain_community.document_loaders:CSVLoader",
+    ".xlsx": "langchain_community.document_loaders.excel:UnstructuredExcelLoader",
+    ".docx": "langchain_community.document_loaders:Docx2txtLoader",
+    ".json": "src.data_loader:RecordLoader",
+    ".jsonl": "src.data_loader:RecordLoader",
+}
+
+def iter_records(file_path: str) -> Iterator[Dict[str, Any]]:
     """
-    Load all supported files from the data directory and convert to LangChain document structure.
-    Supported: PDF, TXT, CSV, Excel, Word, JSON
+    Stream records from a JSONL, JSON or CSV file. A JSON file may hold a list of records or
+    a single object; non-object items are wrapped as {"value": item}. CSV values stay strings.
+    """
+    suffix = Path(file_path).suffix.lower()
+    with open(file_path, "r", encoding="utf-8", newline="" if suffix == ".csv" else None) as f:
+        if suffix == ".csv":
+            yield from csv.DictReader(f)
+            return
+        if suffix == ".json":
+            data = json.load(f)
+            items = data if isinstance(data, list) else [data]
+        else:
+            items = (json.loads(line) for line in f if line.strip())
+        for item in items:
+            yield item if isinstance(item, dict) else {"value": item}
+
+def record_text(record: Dict[str, Any], fields: Optional[List[str]] = None) -> str:
+    """Render a record as "field: value" lines (lists joined with ", "), over fields or all of them."""
+    lines = []
+    for field in fields or list(record):
+        value = record.get(field)
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(v).strip() for v in value)
+        elif isinstance(value, dict):
+            value = json.dumps(value, ensure_ascii=False)
+        lines.append(f"{field}: {value}")
+    return "\n".join(lines)
+
+class RecordLoader:
+    """
+    Loader for JSON and JSONL files: one document per record, rendered with record_text.
+    Replaces LangChain's JSONLoader, which needs a per-file jq schema (and the jq package).
     """
-    # Use project root data folder
+    def __init__(self, file_path: str, text_fields: Optional[List[str]] = None):
+        self.file_path = str(file_path)
+        self.text_fields = text_fields
+
+    def lazy_load(self) -> Iterator[Any]:
+        from langchain_core.documents import Document
+        for row, record in enumerate(iter_records(self.file_path)):
+            text = record_text(record, self.text_fields)
+            if text:
+                yield Document(page_content=text, metadata={"source": self.file_path, "row": row})
+
+    def load(self) -> List[Any]:
+        return list(self.lazy_load())
+
+def register_loader(extension: str, loader_cls: Any):
+    """Register (or override) the loader used for files with the given extension; a class or "module:Class"."""
+    LOADERS[extension.lower()] = loader_cls
+
+def loader_class(extension: str) -> Optional[Any]:
+    """The loader class for a file extension, importing it on first use; None if unsupported."""
+    loader_cls = LOADERS.get(extension.lower())
+    if isinstance(loader_cls, str):
+        module_name, class_name = loader_cls.split(":")
+        loader_cls = LOADERS[extension.lower()] = getattr(importlib.import_module(module_name), class_name)
+    return loader_cls
+
+def list_supported_files(data_dir: str) -> List[Path]:
+    """Return every file under data_dir whose extension has a registered loader, in a single tree walk."""
     data_path = Path(data_dir).resolve()
-    print(f"[DEBUG] Data path: {data_path}")
-    documents = []
-
-    # PDF files
-    pdf_files = list(data_path.glob('**/*.pdf'))
-    print(f"[DEBUG] Found {len(pdf_files)} PDF files: {[str(f) for f in pdf_files]}")
-    for pdf_file in pdf_files:
-        print(f"[DEBUG] Loading PDF: {pdf_file}")
-        try:
-            loader = PyPDFLoader(str(pdf_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} PDF docs from {pdf_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load PDF {pdf_file}: {e}")
-
-    # TXT files
-    txt_files = list(data_path.glob('**/*.txt'))
-    print(f"[DEBUG] Found {len(txt_files)} TXT files: {[str(f) for f in txt_files]}")
-    for txt_file in txt_files:
-        print(f"[DEBUG] Loading TXT: {txt_file}")
-        try:
-            loader = TextLoader(str(txt_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} TXT docs from {txt_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load TXT {txt_file}: {e}")
-
-    # CSV files
-    csv_files = list(data_path.glob('**/*.csv'))
-    print(f"[DEBUG] Found {len(csv_files)} CSV files: {[str(f) for f in csv_files]}")
-    for csv_file in csv_files:
-        print(f"[DEBUG] Loading CSV: {csv_file}")
-        try:
-            loader = CSVLoader(str(csv_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} CSV docs from {csv_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load CSV {csv_file}: {e}")
-
-    # Excel files
-    xlsx_files = list(data_path.glob('**/*.xlsx'))
-    print(f"[DEBUG] Found {len(xlsx_files)} Excel files: {[str(f) for f in xlsx_files]}")
-    for xlsx_file in xlsx_files:
-        print(f"[DEBUG] Loading Excel: {xlsx_file}")
-        try:
-            loader = UnstructuredExcelLoader(str(xlsx_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} Excel docs from {xlsx_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load Excel {xlsx_file}: {e}")
-
-    # Word files
-    docx_files = list(data_path.glob('**/*.docx'))
-    print(f"[DEBUG] Found {len(docx_files)} Word files: {[str(f) for f in docx_files]}")
-    for docx_file in docx_files:
-        print(f"[DEBUG] Loading Word: {docx_file}")
-        try:
-            loader = Docx2txtLoader(str(docx_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} Word docs from {docx_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load Word {docx_file}: {e}")
-
-    # JSON files
-    json_files = list(data_path.glob('**/*.json'))
-    print(f"[DEBUG] Found {len(json_files)} JSON files: {[str(f) for f in json_files]}")
-    for json_file in json_files:
-        print(f"[DEBUG] Loading JSON: {json_file}")
-        try:
-            loader = JSONLoader(str(json_file))
-            loaded = loader.load()
-            print(f"[DEBUG] Loaded {len(loaded)} JSON docs from {json_file}")
-            documents.extend(loaded)
-        except Exception as e:
-            print(f"[ERROR] Failed to load JSON {json_file}: {e}")
-
-    print(f"[DEBUG] Total loaded documents: {len(documents)}")
+    files = []
+    for root, _, names in os.walk(data_path):
+        for name in names:
+            if Path(name).suffix.lower() in LOADERS:
+                files.append(Path(root) / name)
+    return sorted(files)
+
+def _load_file(file_path: str) -> Tuple[List[Any], bool]:
+    """(documents, whether loading succeeded) for a single file."""
+    try:
+        loader_cls = loader_class(Path(file_path).suffix)
+    except ImportError as e:
+        logger.error(f"No loader available for {file_path}: {e}")
+        return [], False
+    if loader_cls is None:
+        logger.error(f"Unsupported file type: {file_path}")
+        return [], False
+    try:
+        loaded = loader_cls(str(file_path)).load()
+        logger.debug(f"Loaded {len(loaded)} docs from {file_path}")
+        return loaded, True
+    except Exception as e:
+        logger.error(f"Failed to load {file_path}: {e}")
+        return [], False
+
+def load_file(file_path: str) -> List[Any]:
+    """Load a single supported file into LangChain documents. Returns [] if loading fails."""
+    return _load_file(file_path)[0]
+
+def iter_file_documents(file_paths: Iterable[Any], max_workers: Optional[int] = None,
+                        failed: Optional[Set[str]] = None) -> Iterator[Any]:
+    """
+    Parse files in a process pool and yield their documents as each file finishes.
+    At most 2 * max_workers files are in flight, so memory stays bounded on large folders.
+    Runs serially when max_workers <= 1 or there is only one file.
+    Paths (as given) of files that fail to load are added to failed, if passed.
+    """
+    file_paths = [str(p) for p in file_paths]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def collect(file_path: str, result: Tuple[List[Any], bool]) -> List[Any]:
+        documents, ok = result
+        if not ok and failed is not None:
+            failed.add(file_path)
+        return documents
+
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield from collect(file_path, _load_file(file_path))
+        return
+
+    pending = iter(file_paths)
+    # Builds run on a background thread of the UI/server process; forking a process that has
+    # torch, OpenMP and HTTP threads running can deadlock the child, so start clean interpreters
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method)) as executor:
+        in_flight = {}
+        for file_path in pending:
+            in_flight[executor.submit(_load_file, file_path)] = file_path
+            if len(in_flight) >= 2 * max_workers:
+                break
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = in_flight.pop(future)
+                next_path = next(pending, None)
+                if next_path is not None:
+                    in_flight[executor.submit(_load_file, next_path)] = next_path
+                yield from collect(file_path, future.result())
+
+def iter_documents(data_dir: str, max_workers: Optional[int] = None) -> Iterator[Any]:
+    """
+    Stream LangChain documents for all supported files in the data directory.
+    Supported: PDF, TXT, CSV, Excel, Word, JSON, JSONL
+    """
+    files = list_supported_files(data_dir)
+    logger.debug(f"Found {len(files)} supported files under {Path(data_dir).resolve()}")
+    yield from iter_file_documents(files, max_workers=max_workers)
+
+def load_all_documents(data_dir: str, max_workers: Optional[int] = None) -> List[Any]:
+    """
+    Load all supported files from the data directory and convert to LangChain document structure.
+    Supported: PDF, TXT, CSV, Excel, Word, JSON, JSONL
+    """
+    documents = list(iter_documents(data_dir, max_workers=max_workers))
+    logger.debug(f"Total loaded documents: {len(documents)}")
     return documents
 
 # Example usage
 if __name__ == "__main__":
     docs = load_all_documents("data")
     print(f"Loaded {len(docs)} documents.")
-    print("Example document:", docs[0] if docs else None)
\ No newline at end of file
+    print("Example document:", docs[0] if docs else None)
@@ -1,37 +1,98 @@
-from typing import List, Any
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+from typing import List, Any, Iterable, Iterator, Optional
+from src.models import LazyEmbeddingModel
+from src.embedding_cache import EmbeddingCache, chunk_hash, default_embedding_cache
+from src.embedding_engine import EmbeddingEngine, ProgressCallback, default_embedding_engine
 import numpy as np
-from src.data_loader import load_all_documents
+from src.log import get_logger
+from src.metrics import default_metrics
+
+logger = get_logger(__name__)
+metrics = default_metrics()
 
 class EmbeddingPipeline:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, chunk_overlap: int = 200,
+                 embedding_cache: Optional[EmbeddingCache] = None, embedding_engine: Optional[EmbeddingEngine] = None):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.model = SentenceTransformer(model_name)
-        print(f"[INFO] Loaded embedding model: {model_name}")
+        self.model = LazyEmbeddingModel(model_name)
+        # Chunks whose text was embedded before (by any store) are never re-encoded
+        self.cache = embedding_cache if embedding_cache is not None else default_embedding_cache(model_name)
+        # Length-sorted, memory-sized batches, on a multi-process pool for big inputs
+        self.engine = embedding_engine if embedding_engine is not None else default_embedding_engine(model_name)
 
-    def chunk_documents(self, documents: List[Any]) -> List[Any]:
-        splitter = RecursiveCharacterTextSplitter(
+    def _splitter(self):
+        # Imported here so querying a built store never loads the splitter (and langchain_core)
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
             length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+            separators=["\n\n", "\n", " ", ""],
+            add_start_index=True
         )
+
+    def chunk_documents(self, documents: Iterable[Any]) -> List[Any]:
+        splitter = self._splitter()
+        documents = list(documents)
         chunks = splitter.split_documents(documents)
-        print(f"[INFO] Split {len(documents)} documents into {len(chunks)} chunks.")
+        logger.info(f"Split {len(documents)} documents into {len(chunks)} chunks.")
         return chunks
 
-    def embed_chunks(self, chunks: List[Any]) -> np.ndarray:
-        texts = [chunk.page_content for chunk in chunks]
-        print(f"[INFO] Generating embeddings for {len(texts)} chunks...")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        print(f"[INFO] Embeddings shape: {embeddings.shape}")
+    def iter_chunk_batches(self, documents: Iterable[Any], batch_size: int = 256) -> Iterator[List[Any]]:
+        """
+        Split documents as they arrive (e.g. from data_loader.iter_documents) and yield
+        chunks in batches, so embedding can start before all files are parsed.
+        """
+        splitter = self._splitter()
+        batch = []
+        n_docs = n_chunks = 0
+        for doc in documents:
+            n_docs += 1
+            batch.extend(splitter.split_documents([doc]))
+            while len(batch) >= batch_size:
+                n_chunks += batch_size
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            n_chunks += len(batch)
+            yield batch
+        logger.info(f"Split {n_docs} documents into {n_chunks} chunks.")
+
+    def embed_chunks(self, chunks: List[Any], progress: Optional[ProgressCallback] = None) -> np.ndarray:
+        """
+        Embed chunks, encoding only texts missing from the embedding cache.
+        progress(done, total, chunks_per_sec) is called as encoding advances; cached chunks count as done.
+        """
+        return self.embed_texts([chunk.page_content for chunk in chunks], progress=progress)
+
+    def embed_texts(self, texts: List[str], progress: Optional[ProgressCallback] = None) -> np.ndarray:
+        """embed_chunks for plain strings (e.g. structured records rendered as text)."""
+        logger.info(f"Generating embeddings for {len(texts)} chunks...")
+        if not texts:
+            return self.engine.encode(texts)
+        keys = [chunk_hash(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        n_cached = len(texts) - len(missing)
+        if progress is not None:
+            progress(n_cached, len(texts), 0.0)
+        if missing:
+            report = (lambda done, total, rate: progress(n_cached + done, len(texts), rate)) if progress else None
+            with metrics.stage("embed"):
+                encoded = self.engine.encode(list(missing.values()), progress=report)
+            metrics.inc("chunks_encoded", len(missing))
+            self.cache.put_many(list(missing), encoded)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        self.cache.flush()
+        embeddings = np.vstack(vectors)
+        logger.info(f"Embedding cache: {n_cached} of {len(texts)} chunks cached, encoded {len(missing)}.")
+        logger.debug(f"Embeddings shape: {embeddings.shape}")
         return embeddings
 
 # Example usage
 if __name__ == "__main__":
-    
+    from src.data_loader import load_all_documents
     docs = load_all_documents("data")
     emb_pipe = EmbeddingPipeline()
     chunks = emb_pipe.chunk_documents(docs)
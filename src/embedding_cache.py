@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+from src.log import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): writers must not share a cache directory
+    fcntl = None
+
+logger = get_logger(__name__)
+
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.f32"
+USAGE_FILE = "usage.npy"
+META_FILE = "meta.json"
+LOCK_FILE = "lock"
+
+DIGEST_SIZE = 16
+DEFAULT_MAX_BYTES = 1 << 30
+# Eviction trims the cache to this fraction of max_bytes so it doesn't run on every add
+EVICT_TARGET = 0.8
+
+
+def chunk_hash(text: str) -> bytes:
+    """Content key of a chunk: a 16-byte BLAKE2b digest of its UTF-8 text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, on-disk cache of chunk embeddings for one model.
+    keys.bin holds 16-byte chunk hashes and vectors.f32 the matching float32 rows, both
+    append-only; vectors are read through a memory map. Rows beyond the shorter of the two
+    files (an interrupted append) are discarded on open. When the cache grows past
+    max_bytes the least recently used rows are dropped and both files rewritten.
+    Several processes may share a cache directory (e.g. a UI build thread and a server):
+    writes hold an exclusive lock on the directory's lock file and first pick up rows
+    appended by other writers; a rewrite bumps the generation in meta.json, which makes
+    other writers reload instead of appending against stale row numbers.
+    """
+    def __init__(self, cache_dir: str, model_name: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.keys_path = os.path.join(self.dir, KEYS_FILE)
+        self.vectors_path = os.path.join(self.dir, VECTORS_FILE)
+        self.usage_path = os.path.join(self.dir, USAGE_FILE)
+        self.meta_path = os.path.join(self.dir, META_FILE)
+        self.lock_path = os.path.join(self.dir, LOCK_FILE)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        with self._file_lock():
+            self._open()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the cache directory, shared with other processes using it."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Dict[str, Any]:
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "generation": self.generation}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _open(self):
+        """Load the key index from disk; callers hold the file lock."""
+        meta = self._read_meta()
+        self.dim: Optional[int] = meta.get("dim")
+        self.generation = meta.get("generation", 0)
+        n = 0
+        if self.dim and os.path.exists(self.keys_path) and os.path.exists(self.vectors_path):
+            n = min(os.path.getsize(self.keys_path) // DIGEST_SIZE, os.path.getsize(self.vectors_path) // (4 * self.dim))
+            for path, row_bytes in ((self.keys_path, DIGEST_SIZE), (self.vectors_path, 4 * self.dim)):
+                if os.path.getsize(path) != n * row_bytes:
+                    os.truncate(path, n * row_bytes)
+        keys = self._read_keys(0, n)
+        self._rows: Dict[bytes, int] = {bytes(key): row for row, key in enumerate(keys)}
+        self._usage = np.zeros(n, dtype='float64')
+        if n and os.path.exists(self.usage_path):
+            saved = np.load(self.usage_path)[:n]
+            self._usage[:len(saved)] = saved
+        self._map(n)
+
+    def _read_keys(self, start: int, count: int) -> List[bytes]:
+        # Sliced raw bytes: numpy's S16 dtype would strip digests' trailing NULs
+        if not count:
+            return []
+        with open(self.keys_path, "rb") as f:
+            f.seek(start * DIGEST_SIZE)
+            data = f.read(count * DIGEST_SIZE)
+        return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+    def _sync(self):
+        """Catch up with other writers; callers hold the file lock."""
+        if self.dim is None or self._read_meta().get("generation", 0) != self.generation:
+            self._open()
+            return
+        if not os.path.exists(self.keys_path):
+            return
+        n = len(self._usage)
+        on_disk = min(os.path.getsize(self.keys_path) // DIGEST_SIZE, os.path.getsize(self.vectors_path) // (4 * self.dim))
+        if on_disk > n:
+            for row, key in enumerate(self._read_keys(n, on_disk - n), start=n):
+                self._rows.setdefault(key, row)
+            self._usage = np.concatenate([self._usage, np.zeros(on_disk - n)])
+            self._map(on_disk)
+
+    def _map(self, n: int):
+        self._vectors = np.memmap(self.vectors_path, dtype='float32', mode='r', shape=(n, self.dim)) if n else None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._rows) * (DIGEST_SIZE + 4 * (self.dim or 0))
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached vector for each key, or None where the chunk hasn't been embedded yet."""
+        now = time.time()
+        vectors = []
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    vectors.append(None)
+                else:
+                    self.hits += 1
+                    self._usage[row] = now
+                    vectors.append(np.array(self._vectors[row]))
+        return vectors
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype='float32')
+        with self._lock, self._file_lock():
+            self._sync()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_meta()
+            fresh = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in fresh:
+                    fresh[key] = vector
+            if not fresh:
+                return
+            n = len(self._usage)
+            # Vectors first: a crash between the two appends leaves an orphan row that _open drops
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.vstack(list(fresh.values())).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(fresh))
+            for i, key in enumerate(fresh):
+                self._rows[key] = n + i
+            self._usage = np.concatenate([self._usage, np.full(len(fresh), time.time())])
+            self._map(len(self._usage))
+            if self.nbytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Keep the most recently used rows that fit in EVICT_TARGET * max_bytes and rewrite the files."""
+        keep_n = int(EVICT_TARGET * self.max_bytes) // (DIGEST_SIZE + 4 * self.dim)
+        keep = np.sort(np.argsort(-self._usage, kind='stable')[:keep_n])
+        keys = list(self._rows)
+        with open(self.vectors_path + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(self._vectors[keep]).tobytes() if len(keep) else b"")
+        with open(self.keys_path + ".tmp", "wb") as f:
+            f.write(b"".join(keys[row] for row in keep.tolist()))
+        self._vectors = None
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        os.replace(self.keys_path + ".tmp", self.keys_path)
+        self.generation += 1
+        self._write_meta()
+        self.evictions += len(keys) - len(keep)
+        self._rows = {keys[row]: i for i, row in enumerate(keep.tolist())}
+        self._usage = self._usage[keep]
+        self._map(len(keep))
+        logger.info(f"Evicted {len(keys) - len(keep)} entries from the embedding cache.")
+
+    def flush(self):
+        """Persist last-use times, which decide what eviction drops."""
+        with self._lock, self._file_lock():
+            # Rows were renumbered by another writer's eviction; its usage file is the current one
+            if self._read_meta().get("generation", 0) != self.generation:
+                return
+            tmp_path = self.usage_path + ".tmp.npy"
+            np.save(tmp_path, self._usage)
+            os.replace(tmp_path, self.usage_path)
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            self._vectors = None
+            for path in (self.keys_path, self.vectors_path, self.usage_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            # meta.json stays behind with a new generation so other writers drop their rows too
+            self.dim = None
+            self.generation = self._read_meta().get("generation", self.generation) + 1
+            self._write_meta()
+            self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"model": self.model_name, "entries": len(self._rows), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+_default_caches: Dict[str, EmbeddingCache] = {}
+_default_lock = threading.Lock()
+
+
+def default_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Process-wide cache per model, under RAG_EMBEDDING_CACHE_DIR (default "embedding_cache")."""
+    with _default_lock:
+        if model_name not in _default_caches:
+            cache_dir = os.getenv("RAG_EMBEDDING_CACHE_DIR") or "embedding_cache"
+            _default_caches[model_name] = EmbeddingCache(cache_dir, model_name)
+    return _default_caches[model_name]
@@ -0,0 +1,178 @@
+import os
+import time
+import atexit
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from src.models import LazyEmbeddingModel
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+# Below this many texts the pool's per-call overhead outweighs the extra cores; kept well
+# under EmbeddingPipeline's 256-chunk batches so partly cached batches still use the pool
+MIN_POOL_TEXTS = 64
+# Adaptive batch sizes are powers of two within these bounds
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 256
+# Share of available memory the workers' batches may use together
+MEMORY_FRACTION = 0.25
+# Default pool size cap; every worker process loads its own copy of the model
+MAX_DEFAULT_WORKERS = 4
+# Share of available memory the workers' model copies may use together, and the rough
+# footprint of one worker beyond the weights (torch runtime, tokenizer, buffers)
+WORKER_MEMORY_FRACTION = 0.5
+WORKER_BASE_BYTES = 300 << 20
+# Rough peak activation bytes per (token x hidden unit x 4 bytes) for BERT-style encoders:
+# attention scores, the 4x feed-forward expansion and intermediate copies
+ACTIVATION_FACTOR = 16
+# Batches per worker in each pool round; progress is reported between rounds
+ROUND_BATCHES = 4
+
+ProgressCallback = Callable[[int, int, float], None]
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of memory available to new allocations, or None if it can't be determined."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def model_bytes(model) -> int:
+    """Bytes of a torch model's parameters and buffers."""
+    return sum(t.numel() * t.element_size() for t in (*model.parameters(), *model.buffers()))
+
+
+def default_workers(weights_bytes: Optional[int] = None) -> int:
+    """
+    Pool size: RAG_EMBEDDING_WORKERS if set, else half the cores up to MAX_DEFAULT_WORKERS,
+    bounded by how many model copies fit in WORKER_MEMORY_FRACTION of available memory.
+    """
+    if os.getenv("RAG_EMBEDDING_WORKERS"):
+        return max(1, int(os.getenv("RAG_EMBEDDING_WORKERS")))
+    workers = min(MAX_DEFAULT_WORKERS, (os.cpu_count() or 1) // 2)
+    memory = available_memory()
+    if weights_bytes and memory is not None:
+        workers = min(workers, int(WORKER_MEMORY_FRACTION * memory) // (weights_bytes + WORKER_BASE_BYTES))
+    return max(1, workers)
+
+
+class EmbeddingEngine:
+    """
+    CPU embedding engine. Texts are sorted by length so each batch holds similarly sized
+    chunks (little padding), batch size is derived from free memory and the longest text
+    in the batch, and with more than one worker big inputs are encoded on a
+    SentenceTransformer multi-process pool. The pool is started on first use and reused.
+    """
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 min_pool_texts: int = MIN_POOL_TEXTS):
+        self.model = LazyEmbeddingModel(model_name)
+        # None means default_workers(), sized once the model's footprint is known
+        self._workers = workers
+        # None means adaptive
+        self.batch_size = batch_size
+        # Calls with fewer texts encode in-process
+        self.min_pool_texts = min_pool_texts
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        if self._workers is None:
+            self._workers = default_workers(model_bytes(self.model.model) if not os.getenv("RAG_EMBEDDING_WORKERS") else None)
+        return self._workers
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Starting embedding pool with {self.workers} CPU workers...")
+                # Split the cores between workers instead of letting each grab all of them
+                threads = os.environ.get("OMP_NUM_THREADS")
+                os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // self.workers))
+                try:
+                    self._pool = self.model.start_multi_process_pool(["cpu"] * self.workers)
+                finally:
+                    if threads is None:
+                        os.environ.pop("OMP_NUM_THREADS", None)
+                    else:
+                        os.environ["OMP_NUM_THREADS"] = threads
+                atexit.register(self.close)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def adaptive_batch_size(self, longest_chars: int) -> int:
+        """Largest power-of-two batch whose activations fit the memory budget, given the longest text."""
+        if self.batch_size:
+            return self.batch_size
+        memory = available_memory()
+        if memory is None:
+            return 32
+        max_tokens = getattr(self.model, "max_seq_length", None) or 512
+        # ~4 characters per token, plus special tokens
+        tokens = min(longest_chars // 4 + 2, max_tokens)
+        per_text = tokens * self.model.get_sentence_embedding_dimension() * 4 * ACTIVATION_FACTOR
+        fit = int(MEMORY_FRACTION * memory / self.workers) // max(per_text, 1)
+        batch = MIN_BATCH_SIZE
+        while batch * 2 <= min(fit, MAX_BATCH_SIZE):
+            batch *= 2
+        return batch
+
+    def encode(self, texts: List[str], progress: Optional[ProgressCallback] = None) -> np.ndarray:
+        """
+        Embed texts, returning rows in input order. progress(done, total, texts_per_sec)
+        is called after every batch (single process) or pool round.
+        """
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype='float32')
+        # Longest first: the batch size only grows as texts get shorter
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        use_pool = self.workers > 1 and len(texts) >= self.min_pool_texts
+        pool = self._get_pool() if use_pool else None
+        embeddings = None
+        start, done = time.perf_counter(), 0
+        while done < len(texts):
+            batch_size = self.adaptive_batch_size(len(texts[order[done]]))
+            rows = order[done:done + (batch_size * self.workers * ROUND_BATCHES if pool else batch_size)]
+            part = [texts[i] for i in rows]
+            if pool:
+                # chunk_size=batch_size hands each worker contiguous, similarly sized batches
+                vectors = self.model.encode(part, pool=pool, batch_size=batch_size, chunk_size=batch_size, show_progress_bar=False)
+            else:
+                vectors = self.model.encode(part, batch_size=batch_size, show_progress_bar=False)
+            vectors = np.asarray(vectors, dtype='float32')
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype='float32')
+            embeddings[rows] = vectors
+            done += len(rows)
+            if progress is not None:
+                progress(done, len(texts), done / max(time.perf_counter() - start, 1e-9))
+        elapsed = time.perf_counter() - start
+        logger.info(f"Encoded {len(texts)} texts in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec, "
+                    f"{self.workers if pool else 1} worker(s)).")
+        return embeddings
+
+
+_engines: Dict[str, EmbeddingEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def default_embedding_engine(model_name: str) -> EmbeddingEngine:
+    """Process-wide engine per model, so the worker pool is started at most once."""
+    with _engines_lock:
+        if model_name not in _engines:
+            _engines[model_name] = EmbeddingEngine(model_name)
+    return _engines[model_name]
@@ -0,0 +1,177 @@
+import math
+import faiss
+import numpy as np
+from typing import Any, Dict, Optional
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+METRICS = ("l2", "cosine")
+
+# Faiss codes for each vector storage precision (ivf_pq always stores PQ codes)
+STORAGE_CODES = {
+    "float32": "Flat",   # 4 bytes per dimension
+    "float16": "SQfp16", # 2 bytes per dimension, no training
+    "sq8": "SQ8",        # 1 byte per dimension, trained per-dimension ranges
+}
+
+# Defaults for every tunable; overridden per store through index_params
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,          # IVF lists; None -> 4 * sqrt(n_train)
+    "pq_m": 8,              # PQ sub-quantizers (must divide the embedding dim)
+    "pq_nbits": 8,          # bits per PQ code
+    "hnsw_m": 32,           # HNSW graph degree
+    "ef_construction": 40,  # HNSW build-time beam width
+    "nprobe": 8,            # IVF lists scanned per query
+    "ef_search": 64,        # HNSW query-time beam width
+    "train_size": 50000,    # max vectors buffered to train IVF/SQ8 indexes
+    "metric": "l2",         # "cosine" normalizes vectors and searches by inner product
+    "storage": "float32",   # vector precision, see STORAGE_CODES
+}
+
+# Knobs that only affect querying; changing them never requires a rebuild
+QUERY_TIME_PARAMS = ("nprobe", "ef_search")
+
+# Fewer training vectors than this per IVF list makes k-means meaningless
+MIN_POINTS_PER_LIST = 39
+
+
+def index_config(index_type: str = "flat", index_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Validate an index type and merge its params over the defaults."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    params = dict(DEFAULT_INDEX_PARAMS)
+    params.update(index_params or {})
+    if params["metric"] not in METRICS:
+        raise ValueError(f"Unknown metric '{params['metric']}', expected one of {METRICS}")
+    if params["storage"] not in STORAGE_CODES:
+        raise ValueError(f"Unknown storage '{params['storage']}', expected one of {tuple(STORAGE_CODES)}")
+    return {"type": index_type, "params": params}
+
+
+def build_signature(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The part of an index config that determines how vectors are stored."""
+    if not config:
+        return None
+    # Configs persisted before a param existed were built with its default
+    params = {**DEFAULT_INDEX_PARAMS, **config["params"]}
+    params = {k: v for k, v in params.items() if k not in QUERY_TIME_PARAMS}
+    return {"type": config["type"], "params": params}
+
+
+def needs_training(config: Dict[str, Any]) -> bool:
+    return config["type"] in ("ivf_flat", "ivf_pq") or config["params"]["storage"] == "sq8"
+
+
+def prepare_vectors(config: Dict[str, Any], vectors: np.ndarray) -> np.ndarray:
+    """Float32, C-contiguous copy of vectors, L2-normalized for cosine indexes."""
+    vectors = np.array(vectors, dtype='float32', order='C')
+    if config["params"]["metric"] == "cosine":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _factory_string(config: Dict[str, Any], dim: int, n_train: int) -> str:
+    index_type, params = config["type"], config["params"]
+    code = STORAGE_CODES[params["storage"]]
+    if index_type == "hnsw":
+        return f"HNSW{params['hnsw_m']},{code}"
+    if index_type in ("ivf_flat", "ivf_pq"):
+        max_lists = n_train // MIN_POINTS_PER_LIST
+        if index_type == "ivf_pq":
+            if dim % params["pq_m"] != 0:
+                raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dim}")
+            # PQ codebooks need at least 2^nbits training points
+            if n_train < (1 << params["pq_nbits"]):
+                max_lists = 0
+        if max_lists >= 2:
+            nlist = params["nlist"] or int(4 * math.sqrt(n_train))
+            nlist = max(2, min(nlist, max_lists))
+            if index_type == "ivf_pq":
+                return f"IVF{nlist},PQ{params['pq_m']}x{params['pq_nbits']}"
+            return f"IVF{nlist},{code}"
+        logger.warning(f"Only {n_train} training vectors, too few for {index_type}; using a flat index "
+                       f"until the store has {min_train_vectors(config)}.")
+    return code
+
+
+def min_train_vectors(config: Dict[str, Any]) -> int:
+    """Fewest vectors the configured IVF index can be trained on (0 for other types)."""
+    if config["type"] not in ("ivf_flat", "ivf_pq"):
+        return 0
+    if config["type"] == "ivf_pq":
+        return max(2 * MIN_POINTS_PER_LIST, 1 << config["params"]["pq_nbits"])
+    return 2 * MIN_POINTS_PER_LIST
+
+
+def is_fallback(index: faiss.Index, config: Dict[str, Any]) -> bool:
+    """Whether an IVF-configured index was created flat for lack of training vectors."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return config["type"] in ("ivf_flat", "ivf_pq") and not isinstance(inner, faiss.IndexIVF)
+
+
+def retrain_fallback(index: faiss.Index, config: Dict[str, Any]) -> faiss.Index:
+    """Rebuild a fallback flat index as the configured IVF index, trained on its own vectors."""
+    ids = faiss.vector_to_array(index.id_map)
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    fresh = create_index(config, index.d, n_train=len(ids))
+    train_index(fresh, vectors, config["params"]["train_size"])
+    fresh.add_with_ids(vectors, ids)
+    return fresh
+
+
+def create_index(config: Dict[str, Any], dim: int, n_train: int = 0) -> faiss.Index:
+    """
+    Build an empty, ID-mapped Faiss index for the given config.
+    n_train is the size of the training sample available, used to size IVF lists.
+    """
+    description = _factory_string(config, dim, n_train)
+    metric = faiss.METRIC_INNER_PRODUCT if config["params"]["metric"] == "cosine" else faiss.METRIC_L2
+    index = faiss.index_factory(dim, f"IDMap2,{description}", metric)
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = config["params"]["ef_construction"]
+    logger.info(f"Created Faiss index: {description} ({config['params']['metric']})")
+    return index
+
+
+def train_index(index: faiss.Index, embeddings: np.ndarray, train_size: int):
+    if index.is_trained:
+        return
+    if embeddings.shape[0] > train_size:
+        rng = np.random.default_rng(0)
+        embeddings = embeddings[rng.choice(embeddings.shape[0], train_size, replace=False)]
+    logger.info(f"Training Faiss index on {embeddings.shape[0]} vectors...")
+    index.train(embeddings)
+
+
+def search_parameters(index: faiss.Index, config: Dict[str, Any], nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None):
+    """
+    Per-query search parameters for the index's actual type. selector restricts the
+    search to a subset of (external) ids. Returns None when defaults apply.
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    params = config["params"]
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=min(nprobe or params["nprobe"], inner.nlist), sel=selector)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or params["ef_search"], sel=selector)
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+
+def rebuild_without(index: faiss.Index, config: Dict[str, Any], ids: np.ndarray) -> faiss.Index:
+    """
+    Remove ids from indexes that can't delete in place (HNSW) by re-adding the
+    surviving vectors into a fresh index. Vectors are reconstructed, not re-embedded.
+    Returns None when no vectors survive.
+    """
+    keep = np.setdiff1d(faiss.vector_to_array(index.id_map), ids)
+    if not len(keep):
+        return None
+    vectors = np.vstack([index.reconstruct(int(i)) for i in keep])
+    fresh = create_index(config, index.d, n_train=len(keep))
+    train_index(fresh, vectors, config["params"]["train_size"])
+    fresh.add_with_ids(vectors, keep)
+    return fresh
@@ -0,0 +1,62 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+
+# Same look as the print()-based output this replaces
+LOG_FORMAT = "[%(levelname)s] %(message)s"
+
+_root = logging.getLogger("rag")
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def _stream_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _configure():
+    global _listener
+    _root.setLevel(os.getenv("RAG_LOG_LEVEL", "INFO").upper())
+    _root.propagate = False
+    if multiprocessing.parent_process() is not None:
+        # Pool workers may exit without running atexit, which would drop queued records
+        _root.addHandler(_stream_handler())
+        return
+    # Records are written to stdout by a listener thread, so request threads never block on I/O
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, _stream_handler())
+    _listener.start()
+    atexit.register(_listener.stop)
+    _root.addHandler(QueueHandler(records))
+
+
+def _after_fork_in_child():
+    # The listener thread doesn't survive fork(); write directly instead
+    global _listener
+    if _listener is not None:
+        _listener = None
+        for handler in list(_root.handlers):
+            _root.removeHandler(handler)
+        _root.addHandler(_stream_handler())
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger for a module, e.g. get_logger(__name__). All loggers share the "rag" parent,
+    whose level comes from RAG_LOG_LEVEL (default INFO).
+    """
+    with _lock:
+        if not _root.handlers:
+            _configure()
+    return _root.getChild(name.rsplit(".", 1)[-1])
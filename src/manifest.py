@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.json"
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """
+    Content-hash manifest stored next to the Faiss index.
+    Records, for every indexed source file, its hash and the vector ids of its chunks,
+    plus the settings the index was built with so a settings change forces a full rebuild.
+    """
+    def __init__(self, persist_dir: str):
+        self.path = os.path.join(persist_dir, MANIFEST_FILE)
+        self.settings: Dict[str, object] = {}
+        self.files: Dict[str, Dict[str, object]] = {}
+        self.next_id = 0
+        # Changes on every save; lets caches detect that the store was rebuilt
+        self.build_id = ""
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.settings = data.get("settings", {})
+        self.files = data.get("files", {})
+        self.next_id = data.get("next_id", 0)
+        self.build_id = data.get("build_id", "")
+
+    def save(self):
+        self.build_id = uuid.uuid4().hex
+        data = {"settings": self.settings, "next_id": self.next_id, "build_id": self.build_id, "files": self.files}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, settings: Dict[str, object]):
+        self.settings = dict(settings)
+        self.files = {}
+        self.next_id = 0
+
+    def allocate_ids(self, count: int) -> List[int]:
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+    def record(self, source: str, content_hash: str, ids: List[int], mtime: Optional[float] = None):
+        entry = {"hash": content_hash, "ids": [int(i) for i in ids]}
+        if mtime is not None:
+            entry["mtime"] = mtime
+        self.files[source] = entry
+
+    def drop(self, source: str) -> List[int]:
+        entry = self.files.pop(source, None)
+        return list(entry["ids"]) if entry else []
+
+    def diff(self, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """Compare {source: hash} against the manifest and return (added, changed, removed) sources."""
+        added = [s for s in current if s not in self.files]
+        changed = [s for s in current if s in self.files and self.files[s]["hash"] != current[s]]
+        removed = [s for s in self.files if s not in current]
+        return added, changed, removed
+
+
+def source_key(path: str) -> str:
+    """Normalize a document source path so manifest keys are stable across runs."""
+    return str(Path(path).resolve())
@@ -0,0 +1,204 @@
+import os
+import re
+import time
+import bisect
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+# Upper bounds (seconds) of the stage latency histogram buckets; a final +Inf bucket is implied
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histogram:
+    """Cumulative-friendly bucket counts plus sum and count; callers hold the registry lock."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the q-quantile, interpolating linearly inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class Metrics:
+    """
+    Per-stage latency histograms, counters and gauges for the query and indexing paths.
+    Collectors are callbacks read at export time (cache stats, index size), so nothing
+    is computed per request for them. When disabled every call is a single flag check
+    and stage() returns a shared no-op context manager.
+
+    Usage:
+        with metrics.stage("search"):
+            index.search(...)
+        metrics.inc("llm_tokens_out", n)
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+
+    def stage(self, name: str):
+        """Context manager timing one run of a pipeline stage."""
+        return _StageTimer(self, name) if self.enabled else _NOOP_TIMER
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        if self.enabled:
+            self._gauges[name] = value
+
+    def register_collector(self, prefix: str, collect: Callable[[], Optional[Dict[str, Any]]]):
+        """
+        Read collect() at export time and publish its numeric values as gauges named
+        prefix_key. Bound methods are held weakly, so registering doesn't keep their
+        owner alive; a collector whose owner is gone (or that returns None) is dropped.
+        Registering the same prefix again replaces the previous collector.
+        """
+        if hasattr(collect, "__self__"):
+            method = weakref.WeakMethod(collect)
+
+            def collect():
+                bound = method()
+                return bound() if bound is not None else None
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    def _collected(self) -> Dict[str, float]:
+        with self._lock:
+            collectors = list(self._collectors.items())
+        gauges = {}
+        for prefix, collect in collectors:
+            try:
+                values = collect()
+            except Exception:
+                values = {}
+            if values is None:
+                with self._lock:
+                    if self._collectors.get(prefix) is collect:
+                        del self._collectors[prefix]
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}_{key}"] = value
+        return gauges
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict view for dashboards: per-stage count/mean/p50/p95/p99 (ms), counters and gauges."""
+        with self._lock:
+            stages = {name: {"count": h.count, "total_s": round(h.sum, 4),
+                             "mean_ms": round(1000 * h.sum / h.count, 3) if h.count else 0.0,
+                             **{f"p{p}_ms": round(1000 * h.quantile(p / 100), 3) for p in (50, 95, 99)}}
+                      for name, h in sorted(self._stages.items())}
+            counters = dict(sorted(self._counters.items()))
+            gauges = dict(self._gauges)
+        gauges.update(self._collected())
+        return {"enabled": self.enabled, "stages": stages, "counters": counters, "gauges": dict(sorted(gauges.items()))}
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format, names prefixed with rag_."""
+        lines = ["# HELP rag_stage_seconds Time spent in each RAG pipeline stage.", "# TYPE rag_stage_seconds histogram"]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            counters = sorted(self._counters.items())
+            gauges = dict(self._gauges)
+        for name, value in counters:
+            metric = "rag_" + _NAME_RE.sub("_", name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        gauges.update(self._collected())
+        for name, value in sorted(gauges.items()):
+            metric = "rag_" + _NAME_RE.sub("_", name)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Clear recorded stages, counters and gauges; collectors stay registered."""
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+_default_metrics: Optional[Metrics] = None
+_default_lock = threading.Lock()
+
+
+def default_metrics() -> Metrics:
+    """Process-wide metrics; set RAG_METRICS=0 to disable collection."""
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics(enabled=os.getenv("RAG_METRICS", "1").lower() not in ("0", "false", "off"))
+    return _default_metrics
@@ -0,0 +1,93 @@
+import threading
+from typing import Any, Callable, Dict, Tuple
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+# Process-wide registry: each embedding model is loaded at most once and shared by
+# FaissVectorStore, EmbeddingPipeline and RAGSearch.
+_models: Dict[str, Any] = {}
+# Guards the registries briefly; loads themselves hold only their model's lock, so a
+# slow download doesn't block callers of other models
+_lock = threading.Lock()
+_load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _load_once(registry: Dict[str, Any], kind: str, model_name: str, load: Callable[[], Any]) -> Any:
+    """registry[model_name], created with load() by the first caller; concurrent callers of the same model wait for it."""
+    model = registry.get(model_name)
+    if model is None:
+        with _lock:
+            lock = _load_locks.setdefault((kind, model_name), threading.Lock())
+        with lock:
+            model = registry.get(model_name)
+            if model is None:
+                model = load()
+                registry[model_name] = model
+                logger.info(f"Loaded {kind}: {model_name}")
+    return model
+
+
+def get_embedding_model(model_name: str):
+    """Return the shared SentenceTransformer for model_name, loading it on first use."""
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return _load_once(_models, "embedding model", model_name, load)
+
+
+def loaded_models():
+    return list(_models)
+
+
+_cross_encoders: Dict[str, Any] = {}
+
+
+def get_cross_encoder(model_name: str):
+    """Return the shared CPU CrossEncoder for model_name (used for re-ranking), loading it on first use."""
+    def load():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name, device="cpu")
+    return _load_once(_cross_encoders, "cross-encoder", model_name, load)
+
+
+_warmers: Dict[str, threading.Thread] = {}
+
+
+def warm_embedding_model(model_name: str) -> threading.Thread:
+    """
+    Load model_name and run one tiny encode on a daemon thread (at most once per model),
+    so torch import, weight loading and first-call setup happen off the request path.
+    A query arriving earlier simply waits for that load in get_embedding_model.
+    """
+    with _lock:
+        thread = _warmers.get(model_name)
+        if thread is None:
+            def warm():
+                try:
+                    get_embedding_model(model_name).encode(["warm up"], show_progress_bar=False)
+                except Exception as e:
+                    logger.warning(f"Warming embedding model {model_name} failed: {e}")
+
+            thread = _warmers[model_name] = threading.Thread(target=warm, name=f"warm-{model_name}", daemon=True)
+            thread.start()
+    return thread
+
+
+class LazyEmbeddingModel:
+    """
+    Stand-in for a SentenceTransformer that resolves to the shared registry instance
+    the first time it is used, so constructing stores and pipelines stays cheap.
+    """
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def model(self):
+        return get_embedding_model(self.model_name)
+
+    def encode(self, *args, **kwargs):
+        return self.model.encode(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.model, name)
@@ -0,0 +1,442 @@
+"""
+Structured-record store: JSONL/JSON/CSV catalogs (e.g. books.jsonl) embedded one record per
+vector, with numeric and keyword fields kept in columnar NumPy arrays next to the Faiss index.
+Filters and sorts run in-process over those arrays, so queries like "fantasy before 1998
+sorted by rating" need no external search service:
+
+    store = RecordStore("books_store")
+    store.ingest("books.jsonl")
+    store.search_records("fantasy", filter={"publication_year": {"<": 1998}}, sort_by="average_rating:desc")
+
+Usage:
+    python -m src.records ingest books.jsonl --store books_store
+    python -m src.records search "fantasy" --store books_store --filter "publication_year:<1998" --sort average_rating:desc
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from src.vectorstore import FaissVectorStore
+from src.manifest import file_hash, source_key
+from src.index_factory import needs_training
+from src.data_loader import iter_records, record_text
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+COLUMNS_FILE = "columns.npz"
+SCHEMA_FILE = "columns.json"
+
+NUMERIC_OPS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "!=": np.not_equal,
+}
+
+
+def _number(value: Any) -> float:
+    """Float value of a record field; NaN when missing or not numeric (e.g. an empty CSV cell)."""
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _keywords(value: Any) -> List[str]:
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [normalize_keyword(v) for v in values if v is not None and str(v).strip()]
+
+
+def normalize_keyword(value: Any) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+def infer_fields(record: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Field roles from a sample record: numbers (including numeric strings, as in CSV files)
+    are numeric columns, lists are keyword columns, and the remaining strings (except URLs)
+    plus keyword lists make up the embedded text.
+    """
+    numeric = [k for k, v in record.items() if not isinstance(v, list) and not np.isnan(_number(v))]
+    keyword = [k for k, v in record.items() if isinstance(v, list)]
+    text = [k for k, v in record.items() if k in keyword or
+            (isinstance(v, str) and k not in numeric and not v.startswith(("http://", "https://")))]
+    return {"text": text, "numeric": numeric, "keyword": keyword}
+
+
+def parse_filter(filter_by: str) -> Dict[str, Any]:
+    """
+    Translate a Typesense-style filter_by string into a RecordStore filter, e.g.
+    "publication_year:<1998 && authors:[J.K. Rowling, Suzanne Collins]" ->
+    {"publication_year": {"<": 1998.0}, "authors": ["J.K. Rowling", "Suzanne Collins"]}.
+    """
+    result: Dict[str, Any] = {}
+    for clause in filter(None, (c.strip() for c in filter_by.split("&&"))):
+        field, sep, expr = clause.partition(":")
+        if not sep:
+            raise ValueError(f"Bad filter clause {clause!r}; expected field:value")
+        field, expr = field.strip(), expr.strip()
+        if expr.startswith("[") and expr.endswith("]"):
+            result[field] = [v.strip() for v in expr[1:-1].split(",") if v.strip()]
+            continue
+        for op in ("<=", ">=", "!=", "<", ">", "="):
+            if expr.startswith(op):
+                value = expr[len(op):].strip()
+                op = "==" if op == "=" else op
+                break
+        else:
+            op, value = "==", expr
+        number = _number(value)
+        conditions = result.setdefault(field, {})
+        conditions[op] = value if np.isnan(number) else number
+    return result
+
+
+class RecordColumns:
+    """
+    Numeric and keyword fields of every record as arrays indexed by record id. Numeric
+    fields are float64 (NaN = missing); multi-valued keyword fields are stored as parallel
+    (row id, term code) arrays. Appends are buffered and merged on the next read.
+    """
+    def __init__(self, numeric_fields: Iterable[str] = (), keyword_fields: Iterable[str] = ()):
+        self.numeric = {field: np.zeros(0) for field in numeric_fields}
+        self.keyword_rows = {field: np.zeros(0, dtype='int64') for field in keyword_fields}
+        self.keyword_codes = {field: np.zeros(0, dtype='int32') for field in keyword_fields}
+        self.vocab: Dict[str, Dict[str, int]] = {field: {} for field in keyword_fields}
+        self.alive = np.zeros(0, dtype=bool)
+        self._pending: List[Tuple[List[int], List[Dict[str, Any]]]] = []
+
+    def append(self, ids: List[int], records: List[Dict[str, Any]]):
+        self._pending.append((list(ids), records))
+
+    def remove(self, ids: Iterable[int]):
+        self._merge()
+        ids = np.asarray([i for i in ids if i < len(self.alive)], dtype='int64')
+        self.alive[ids] = False
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self.alive)
+
+    def _merge(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        size = max(len(self.alive), max(max(ids) for ids, _ in pending if ids) + 1)
+        grow = size - len(self.alive)
+        self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+        for field in self.numeric:
+            self.numeric[field] = np.concatenate([self.numeric[field], np.full(grow, np.nan)])
+        for ids, records in pending:
+            ids_arr = np.asarray(ids, dtype='int64')
+            self.alive[ids_arr] = True
+            for field, column in self.numeric.items():
+                column[ids_arr] = [_number(record.get(field)) for record in records]
+        for field, vocab in self.vocab.items():
+            rows, codes = [self.keyword_rows[field]], [self.keyword_codes[field]]
+            for ids, records in pending:
+                row_part, code_part = [], []
+                for vec_id, record in zip(ids, records):
+                    for term in _keywords(record.get(field)):
+                        row_part.append(vec_id)
+                        code_part.append(vocab.setdefault(term, len(vocab)))
+                rows.append(np.asarray(row_part, dtype='int64'))
+                codes.append(np.asarray(code_part, dtype='int32'))
+            self.keyword_rows[field] = np.concatenate(rows)
+            self.keyword_codes[field] = np.concatenate(codes)
+
+    def mask(self, filter: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        Boolean mask over record ids. filter maps field -> condition:
+          numeric: a value, a list (any of), or {op: value} with op in < <= > >= == !=
+          keyword: a value or a list (any of, case-insensitive), or {"!=": value or list}
+        Records missing a filtered field never match.
+        """
+        self._merge()
+        mask = self.alive.copy()
+        for field, condition in (filter or {}).items():
+            if field in self.numeric:
+                column = self.numeric[field]
+                if not isinstance(condition, dict):
+                    condition = {"in": condition} if isinstance(condition, (list, tuple)) else {"==": condition}
+                mask &= ~np.isnan(column)
+                for op, value in condition.items():
+                    if op == "in":
+                        mask &= np.isin(column, [_number(v) for v in value])
+                    elif op in NUMERIC_OPS:
+                        mask &= NUMERIC_OPS[op](column, _number(value))
+                    else:
+                        raise ValueError(f"Unknown operator {op!r} for numeric field {field!r}")
+            elif field in self.vocab:
+                negate = isinstance(condition, dict)
+                if negate:
+                    if set(condition) != {"!="}:
+                        raise ValueError(f"Keyword field {field!r} supports a value, a list or {{'!=': ...}}")
+                    condition = condition["!="]
+                wanted = [self.vocab[field][t] for t in _keywords(condition) if t in self.vocab[field]]
+                hit = np.zeros(len(mask), dtype=bool)
+                hit[self.keyword_rows[field][np.isin(self.keyword_codes[field], wanted)]] = True
+                mask &= ~hit if negate else hit
+            else:
+                raise ValueError(f"Cannot filter on {field!r}; numeric fields: {sorted(self.numeric)}, "
+                                 f"keyword fields: {sorted(self.vocab)}")
+        return mask
+
+    def sort_key(self, field: str) -> np.ndarray:
+        self._merge()
+        if field not in self.numeric:
+            raise ValueError(f"Cannot sort on {field!r}; numeric fields: {sorted(self.numeric)}")
+        return self.numeric[field]
+
+    def facet_counts(self, field: str, ids: np.ndarray, top: int = 10) -> List[Tuple[str, int]]:
+        """Most frequent values of a keyword field among ids."""
+        self._merge()
+        selected = np.zeros(len(self.alive), dtype=bool)
+        selected[ids] = True
+        codes = self.keyword_codes[field][selected[self.keyword_rows[field]]]
+        counts = np.bincount(codes, minlength=len(self.vocab[field]))
+        terms = list(self.vocab[field])
+        order = np.argsort(-counts, kind='stable')[:top]
+        return [(terms[i], int(counts[i])) for i in order if counts[i]]
+
+    def reset(self):
+        self.__init__(list(self.numeric), list(self.vocab))
+
+    def save(self, persist_dir: str):
+        self._merge()
+        arrays = {"alive": self.alive}
+        arrays.update({f"numeric/{field}": column for field, column in self.numeric.items()})
+        arrays.update({f"rows/{field}": rows for field, rows in self.keyword_rows.items()})
+        arrays.update({f"codes/{field}": codes for field, codes in self.keyword_codes.items()})
+        tmp_path = os.path.join(persist_dir, COLUMNS_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, os.path.join(persist_dir, COLUMNS_FILE))
+        tmp_path = os.path.join(persist_dir, SCHEMA_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"vocab": {field: list(vocab) for field, vocab in self.vocab.items()}}, f)
+        os.replace(tmp_path, os.path.join(persist_dir, SCHEMA_FILE))
+
+    def load(self, persist_dir: str):
+        with open(os.path.join(persist_dir, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)["vocab"]
+        self.vocab = {field: {term: i for i, term in enumerate(terms)} for field, terms in vocab.items()}
+        with np.load(os.path.join(persist_dir, COLUMNS_FILE)) as data:
+            self.alive = data["alive"]
+            self.numeric = {field: data[f"numeric/{field}"] for field in self.numeric}
+            self.keyword_rows = {field: data[f"rows/{field}"] for field in self.vocab}
+            self.keyword_codes = {field: data[f"codes/{field}"] for field in self.vocab}
+        self._pending = []
+
+
+class RecordStore(FaissVectorStore):
+    """
+    FaissVectorStore whose entries are structured records rather than document chunks.
+    Each record's text fields are embedded (through the shared embedding cache) and
+    indexed in BM25; its numeric and keyword fields go to RecordColumns. filter arguments
+    of every search method are resolved against the columns (see RecordColumns.mask).
+
+    Field roles default to infer_fields() on the first ingested record; a store keeps the
+    roles it was built with, and ingesting with different ones rebuilds it.
+    """
+    def __init__(self, persist_dir: str = "records_store", text_fields: Optional[List[str]] = None,
+                 numeric_fields: Optional[List[str]] = None, keyword_fields: Optional[List[str]] = None, **kwargs):
+        self.fields = {"text": text_fields, "numeric": numeric_fields, "keyword": keyword_fields}
+        super().__init__(persist_dir, **kwargs)
+        self.columns = RecordColumns()
+
+    def _settings(self) -> Dict[str, Any]:
+        return {**super()._settings(), "fields": self.fields}
+
+    def _resolve_fields(self, sample: Optional[Dict[str, Any]]):
+        """Fill unspecified field roles from the persisted store, else from a sample record."""
+        persisted = self.manifest.settings.get("fields") or {}
+        inferred = infer_fields(sample) if sample else {}
+        for role in self.fields:
+            if self.fields[role] is None:
+                self.fields[role] = persisted.get(role, inferred.get(role))
+        numeric, keyword = self.fields["numeric"] or [], self.fields["keyword"] or []
+        if list(self.columns.numeric) != numeric or list(self.columns.vocab) != keyword:
+            self.columns = RecordColumns(numeric, keyword)
+
+    def _reset(self):
+        super()._reset()
+        self.columns.reset()
+
+    def remove_ids(self, ids: List[int]):
+        removed = super().remove_ids(ids)
+        if ids:
+            self.columns.remove(ids)
+        return removed
+
+    def save(self):
+        super().save()
+        self.columns.save(self.persist_dir)
+
+    def load(self, mmap: bool = False):
+        super().load(mmap=mmap)
+        self._resolve_fields(None)
+        # Columns of a store built with other field roles are dropped by the next ingest
+        if self.manifest.settings.get("fields") == self.fields and os.path.exists(os.path.join(self.persist_dir, COLUMNS_FILE)):
+            self.columns.load(self.persist_dir)
+
+    def ingest(self, path: str, batch_size: int = 1024, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, int]:
+        """
+        Stream a JSONL, JSON or CSV file into the store in batches of batch_size records.
+        An unchanged file is skipped; a changed one replaces its previous records.
+        progress, if given, receives {"records_done", "records_per_sec"} after each batch.
+        """
+        if self.exists():
+            self.load()
+        records = iter_records(path)
+        first = next(records, None)
+        if first is None:
+            logger.warning(f"No records in {path}.")
+            return {"records": 0, "removed": 0}
+        self._resolve_fields(first)
+        if self.index is None or not self.manifest.exists() or not self._is_compatible():
+            logger.info("No compatible record store found, starting a new one.")
+            self._reset()
+        source, digest = source_key(path), file_hash(path)
+        entry = self.manifest.files.get(source)
+        if entry is not None and entry["hash"] == digest:
+            logger.info(f"{path} is unchanged; nothing to ingest.")
+            return {"records": 0, "removed": 0}
+        stale = self.manifest.drop(source)
+        self.remove_ids(stale)
+
+        records = chain([first], records)
+        ids_all: List[int] = []
+        pending_ids, pending_records, pending_vectors = [], [], []
+        train_size = self.index_config["params"]["train_size"]
+        start = time.perf_counter()
+
+        def flush():
+            metadatas = [{**record, "text": record_text(record, self.fields["text"]), "source": source,
+                          "file_type": os.path.splitext(source)[1].lstrip(".").lower()} for record in pending_records]
+            self.add_embeddings(np.vstack(pending_vectors), metadatas, ids=list(pending_ids))
+            self.columns.append(pending_ids, list(pending_records))
+            ids_all.extend(pending_ids)
+            pending_ids.clear()
+            pending_records.clear()
+            pending_vectors.clear()
+
+        batch = list(islice(records, batch_size))
+        while batch:
+            ids = self.manifest.allocate_ids(len(batch))
+            pending_vectors.append(self.pipeline.embed_texts([record_text(r, self.fields["text"]) for r in batch]))
+            pending_ids.extend(ids)
+            pending_records.extend(batch)
+            # Indexes that need training buffer vectors until there is a big enough sample
+            if not (self.index is None and needs_training(self.index_config) and len(pending_ids) < train_size):
+                flush()
+            if progress is not None:
+                done = len(ids_all) + len(pending_ids)
+                progress({"records_done": done, "records_per_sec": done / max(time.perf_counter() - start, 1e-9)})
+            batch = list(islice(records, batch_size))
+        if pending_ids:
+            flush()
+        self.manifest.record(source, digest, ids_all, mtime=os.path.getmtime(path))
+        self.save()
+        logger.info(f"Ingested {len(ids_all)} records from {path} ({len(stale)} previous records replaced).")
+        return {"records": len(ids_all), "removed": len(stale)}
+
+    def candidate_ids(self, filter: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """Record ids matching a field filter (see RecordColumns.mask); None means no filter."""
+        if not filter:
+            return None
+        return np.flatnonzero(self.columns.mask(filter)).astype('int64')
+
+    @staticmethod
+    def _parse_sort(sort_by: Optional[str]) -> Tuple[Optional[str], bool]:
+        """"field:desc" / "field:asc" / "field" (ascending) -> (field, descending)."""
+        if not sort_by:
+            return None, False
+        field, _, order = sort_by.partition(":")
+        return field, order.strip().lower() == "desc"
+
+    def _sorted(self, ids: np.ndarray, sort_by: Optional[str], top_k: int) -> np.ndarray:
+        field, descending = self._parse_sort(sort_by)
+        if field is None:
+            return ids[:top_k]
+        values = self.columns.sort_key(field)[ids]
+        # Missing values sort last in either direction
+        keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+        if len(ids) > top_k:
+            part = np.argpartition(keys, top_k - 1)[:top_k]
+            return ids[part[np.argsort(keys[part], kind='stable')]]
+        return ids[np.argsort(keys, kind='stable')]
+
+    def search_records(self, query: Optional[str] = None, top_k: int = 10, filter: Optional[Dict[str, Any]] = None,
+                       sort_by: Optional[str] = None, n_candidates: Optional[int] = None, hybrid: bool = True) -> List[Dict[str, Any]]:
+        """
+        Filtered, optionally sorted record search; results are {"index", "metadata"} dicts
+        (metadata is the stored record plus its embedded "text").
+          query=None: every record matching filter, ordered by sort_by (a pure column scan).
+          query given: the n_candidates (default 5 * top_k) best matches within filter, dense and,
+          if hybrid, BM25 results fused by reciprocal rank, then re-ordered by sort_by if given.
+        filter is a dict (see RecordColumns.mask) or a Typesense-style string (see parse_filter);
+        sort_by is "field", "field:asc" or "field:desc".
+        """
+        if isinstance(filter, str):
+            filter = parse_filter(filter)
+        if query is None:
+            mask = self.columns.mask(filter)
+            ids = self._sorted(np.flatnonzero(mask), sort_by, top_k)
+            return [{"index": int(i), "metadata": meta} for i, meta in zip(ids, self.chunks.get_many(ids.tolist()))]
+        from src.search import reciprocal_rank_fusion
+        n_candidates = max(n_candidates or 5 * top_k, top_k)
+        _, hits = self.query_with_embedding(query, top_k=n_candidates, filter=filter)
+        if hybrid:
+            hits = reciprocal_rank_fusion([hits, self.lexical_search(query, top_k=n_candidates, filter=filter)])
+        if sort_by is None:
+            return hits[:top_k]
+        by_id = {int(hit["index"]): hit for hit in hits}
+        order = self._sorted(np.fromiter(by_id, dtype='int64', count=len(by_id)), sort_by, top_k)
+        return [by_id[int(i)] for i in order]
+
+    def facets(self, field: str, filter: Optional[Dict[str, Any]] = None, top: int = 10) -> List[Tuple[str, int]]:
+        """Most frequent values of a keyword field among the records matching filter."""
+        if isinstance(filter, str):
+            filter = parse_filter(filter)
+        return self.columns.facet_counts(field, np.flatnonzero(self.columns.mask(filter)), top=top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="add or refresh a JSONL/JSON/CSV file")
+    ingest.add_argument("path")
+    ingest.add_argument("--text-fields", nargs="+")
+    ingest.add_argument("--numeric-fields", nargs="+")
+    ingest.add_argument("--keyword-fields", nargs="+")
+    search = sub.add_parser("search", help="filtered, sorted search")
+    search.add_argument("query", nargs="?")
+    search.add_argument("--filter", help='Typesense-style filter, e.g. "publication_year:<1998 && authors:[J.K. Rowling]"')
+    search.add_argument("--sort", help="field, field:asc or field:desc")
+    search.add_argument("--top-k", type=int, default=10)
+    search.add_argument("--facet", help="also print value counts of this keyword field")
+    for command in (ingest, search):
+        command.add_argument("--store", default="records_store")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        store = RecordStore(args.store, text_fields=args.text_fields, numeric_fields=args.numeric_fields,
+                            keyword_fields=args.keyword_fields)
+        print(store.ingest(args.path))
+        return
+    store = RecordStore(args.store)
+    store.load()
+    for result in store.search_records(args.query, top_k=args.top_k, filter=args.filter, sort_by=args.sort):
+        record = {k: v for k, v in result["metadata"].items() if k not in ("text", "source", "file_type")}
+        print(json.dumps(record, ensure_ascii=False))
+    if args.facet:
+        print(store.facets(args.facet, filter=args.filter))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import time
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional
+from src.cache import LRUCache, normalize_query
+from src.embedding_cache import chunk_hash
+from src.models import get_cross_encoder
+from src.log import get_logger
+from src.metrics import default_metrics
+
+logger = get_logger(__name__)
+metrics = default_metrics()
+
+# Small MS MARCO cross-encoder; scores ~20 (query, chunk) pairs in well under 100 ms on a laptop CPU
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores retrieved chunks against the query with a local cross-encoder and returns
+    the best top_n. Pairs are scored in batches of batch_size; scores are cached per
+    (model, normalized query, chunk text), so repeated and follow-up queries only score
+    chunks they haven't seen. If scoring runs past time_budget_ms, the input (retrieval)
+    order is kept instead, so a slow CPU never holds up an answer by more than the budget.
+    With min_score set, chunks scoring below it are dropped (at least one is always kept).
+    """
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, batch_size: int = 16, time_budget_ms: float = 300.0,
+                 min_score: Optional[float] = None, cache_size: int = 8192):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.time_budget = time_budget_ms / 1000
+        self.min_score = min_score
+        self.cache = LRUCache(max_entries=cache_size, sizeof=lambda value: 8)
+        self.timeouts = 0
+
+    @property
+    def model(self):
+        return get_cross_encoder(self.model_name)
+
+    def warm(self) -> threading.Thread:
+        """Load the model on a daemon thread, so the first re-ranked query doesn't pay for it."""
+        def warm():
+            try:
+                self.model.predict([("warm up", "warm up")], show_progress_bar=False)
+            except Exception as e:
+                logger.warning(f"Warming cross-encoder {self.model_name} failed: {e}")
+
+        thread = threading.Thread(target=warm, name=f"warm-{self.model_name}", daemon=True)
+        thread.start()
+        return thread
+
+    def scores(self, query: str, texts: List[str], deadline: Optional[float] = None) -> Optional[np.ndarray]:
+        """Cross-encoder scores of (query, text) pairs; None if the deadline passed first."""
+        query = normalize_query(query)
+        keys = [(self.model_name, query, chunk_hash(text)) for text in texts]
+        scores = np.array([self.cache.get(key, np.nan) for key in keys], dtype='float64')
+        missing = np.flatnonzero(np.isnan(scores))
+        if len(missing):
+            model = self.model
+            for start in range(0, len(missing), self.batch_size):
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                batch = missing[start:start + self.batch_size]
+                batch_scores = model.predict([(query, texts[i]) for i in batch], batch_size=self.batch_size,
+                                             show_progress_bar=False)
+                for i, score in zip(batch, np.asarray(batch_scores, dtype='float64').reshape(-1)):
+                    scores[i] = score
+                    self.cache.put(keys[i], float(score))
+        return scores
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """results re-ordered by cross-encoder score (as "rerank_score"), cut to top_n."""
+        if len(results) <= 1:
+            return results[:top_n]
+        texts = [(r.get("metadata") or {}).get("text", "") for r in results]
+        # Loading the model is a one-off and doesn't count against the budget
+        self.model
+        with metrics.stage("rerank"):
+            scores = self.scores(query, texts, deadline=time.perf_counter() + self.time_budget)
+        if scores is None:
+            self.timeouts += 1
+            metrics.inc("rerank_timeouts")
+            logger.debug("Re-ranking '%s' ran past %.0f ms; keeping retrieval order", query, 1000 * self.time_budget)
+            return results[:top_n]
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        if self.min_score is not None:
+            order = [i for j, i in enumerate(order) if j == 0 or scores[i] >= self.min_score]
+        return [{**results[i], "rerank_score": float(scores[i])} for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "timeouts": self.timeouts}
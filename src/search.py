@@ -1,41 +1,359 @@
 import os
+import copy
+import time
+import asyncio
+import threading
+import weakref
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 from src.vectorstore import FaissVectorStore
-from langchain_groq import ChatGroq
+from src.sharded_store import open_vector_store, store_exists
+from src.cache import LRUCache, SemanticAnswerCache, default_answer_cache
+from src.context import build_context, context_budget, prompt_budget, estimate_tokens
+from src.models import warm_embedding_model
+from src.rerank import CrossEncoderReranker
+from src.conversation import QueryRewriter, conversation_key, filter_key, user_turns
+from src.log import get_logger
+from src.metrics import default_metrics
+
+logger = get_logger(__name__)
+metrics = default_metrics()
 
 load_dotenv()
 
+PROMPT_TEMPLATE = "Summarize the following context for the query: '{query}'\n\nContext:\n{context}\n\nSummary:"
+
+# Earlier user questions quoted in the prompt of a conversation turn (assistant answers are left out)
+PROMPT_HISTORY_QUESTIONS = 3
+
+# Each retriever contributes this many candidates per requested chunk before fusion
+HYBRID_CANDIDATES_PER_K = 3
+
+# Seconds between checks for a newly swapped-in store version
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """Fuse ranked result lists by summing 1 / (k + rank); returns merged results, best first."""
+    fused: Dict[int, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            entry = fused.setdefault(int(result["index"]), {"rrf_score": 0.0})
+            for key, value in result.items():
+                entry.setdefault(key, value)
+            entry["rrf_score"] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda r: r["rrf_score"], reverse=True)
+
+
+def record_llm_usage(prompt: str, answer: str, usage: Optional[Dict[str, int]]):
+    """Count an LLM call and its tokens, from the response's usage metadata or estimated if it has none."""
+    if not metrics.enabled:
+        return
+    metrics.inc("llm_requests")
+    metrics.inc("llm_tokens_in", usage["input_tokens"] if usage else estimate_tokens(prompt))
+    metrics.inc("llm_tokens_out", usage["output_tokens"] if usage else estimate_tokens(answer))
+
 class RAGSearch:
-    def __init__(self, persist_dir: str = "faiss_store", embedding_model: str = "all-MiniLM-L6-v2", llm_model: str = "llama-3.3-70b-versatile"):
-        self.vectorstore = FaissVectorStore(persist_dir, embedding_model)
+    def __init__(self, persist_dir: str = "faiss_store", embedding_model: str = "all-MiniLM-L6-v2", llm_model: str = "llama-3.3-70b-versatile",
+                 answer_cache: Optional[SemanticAnswerCache] = None, max_concurrency: int = 32, retrieval_workers: int = 4,
+                 query_batch_size: int = 1, query_batch_wait_ms: float = 5.0, hybrid: bool = True, rrf_k: int = 60,
+                 context_token_budget: Optional[int] = None, mmap_index: bool = True, warm_model: bool = False,
+                 rewrite_model: Optional[str] = None, turn_cache_size: int = 1024,
+                 rerank_model: Optional[str] = None, rerank_candidates: int = 20, rerank_budget_ms: float = 300.0):
+        self.persist_dir = persist_dir
+        # Memory-map persisted indexes: startup doesn't wait for the whole index to be read
+        self.mmap_index = mmap_index
+        self._store_kwargs = {"embedding_model": embedding_model, "max_batch": query_batch_size, "max_wait_ms": query_batch_wait_ms}
+        # Live store, its version and the next reload check; shared with with_llm() copies
+        self._store = {"store": None, "version": None, "next_check": time.monotonic() + RELOAD_CHECK_INTERVAL}
+        self._reload_lock = threading.Lock()
+        # Plain or sharded, depending on what persist_dir holds
+        self.vectorstore = open_vector_store(persist_dir, **self._store_kwargs)
         # Load or build vectorstore
-        faiss_path = os.path.join(persist_dir, "faiss.index")
-        meta_path = os.path.join(persist_dir, "metadata.pkl")
-        if not (os.path.exists(faiss_path) and os.path.exists(meta_path)):
-            from data_loader import load_all_documents
-            docs = load_all_documents("data")
-            self.vectorstore.build_from_documents(docs)
+        if not self.vectorstore.exists():
+            self.vectorstore.update_from_directory("data")
+            self._store["version"] = os.path.realpath(persist_dir)
         else:
-            self.vectorstore.load()
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
-            print("[WARNING] GROQ_API_KEY not found in environment variables!")
-        self.llm = ChatGroq(groq_api_key=groq_api_key, model_name=llm_model)
-        print(f"[INFO] Groq LLM initialized: {llm_model}")
-
-    def search_and_summarize(self, query: str, top_k: int = 5) -> str:
-        results = self.vectorstore.query(query, top_k=top_k)
-        texts = [r["metadata"].get("text", "") for r in results if r["metadata"]]
-        context = "\n\n".join(texts)
+            self.reload()
+        # Load the embedding model on a background thread so the first query doesn't wait for it
+        if warm_model:
+            warm_embedding_model(embedding_model)
+        if not os.getenv("GROQ_API_KEY"):
+            logger.warning("GROQ_API_KEY not found in environment variables!")
+        # Hybrid retrieval fuses dense (Faiss) and lexical (BM25) rankings
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        self.llm_model = llm_model
+        # Retrieved chunks are deduped and packed into this many prompt tokens
+        self.context_token_budget = context_token_budget or context_budget(llm_model)
+        # Created on first answer, so retrieval-only use never imports langchain_groq
+        self._llm = None
+        # Shared across instances; entries are keyed by store build, so rebuilds invalidate them
+        self.answer_cache = answer_cache if answer_cache is not None else default_answer_cache()
+        # Conversation turns: follow-ups are rewritten into standalone queries (heuristically, or by
+        # rewrite_model, e.g. "llama-3.1-8b-instant"), and each turn's retrieval results are kept
+        # so repeated turns skip retrieval and follow-ups can reuse the previous turn's chunks
+        self.rewriter = QueryRewriter(llm_model=rewrite_model, cache_size=turn_cache_size)
+        self.turn_cache = LRUCache(max_entries=turn_cache_size)
+        # Optional re-ranking: over-fetch rerank_candidates chunks, re-score them with a local
+        # cross-encoder (e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2") and keep the best top_k
+        self.reranker = CrossEncoderReranker(rerank_model, time_budget_ms=rerank_budget_ms) if rerank_model else None
+        self.rerank_candidates = rerank_candidates
+        if self.reranker is not None and warm_model:
+            self.reranker.warm()
+        # Async API: embedding/Faiss work runs on a bounded pool, and at most
+        # max_concurrency requests are in flight per event loop (the rest wait)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="rag-retrieval")
+        self._limiters = weakref.WeakKeyDictionary()
+        # Read at export time only; see src.metrics
+        metrics.register_collector("query_cache", self.vectorstore.query_cache.stats)
+        metrics.register_collector("answer_cache", self.answer_cache.stats)
+        metrics.register_collector("turn_cache", self.turn_cache.stats)
+        if self.reranker is not None:
+            metrics.register_collector("rerank_cache", self.reranker.stats)
+        metrics.register_collector("embedding_cache", self.vectorstore.pipeline.cache.stats)
+        metrics.register_collector("index", self.index_stats)
+
+    @property
+    def vectorstore(self):
+        return self._store["store"]
+
+    @vectorstore.setter
+    def vectorstore(self, store):
+        self._store["store"] = store
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            self._llm = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name=self.llm_model)
+            logger.info(f"Groq LLM initialized: {self.llm_model}")
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    def with_llm(self, llm_model: str) -> "RAGSearch":
+        """A RAGSearch answering with another Groq model that shares this one's store, caches and pools."""
+        if llm_model == self.llm_model:
+            return self
+        clone = copy.copy(self)
+        clone.llm_model = llm_model
+        clone.context_token_budget = context_budget(llm_model)
+        clone.llm = None
+        return clone
+
+    def reload(self):
+        """
+        Load the store version persist_dir currently points to and swap it in.
+        Background builds (src.build_jobs) repoint persist_dir atomically; requests
+        already running keep using the store they started with.
+        """
+        version = os.path.realpath(self.persist_dir)
+        # Load from the resolved directory so a swap mid-load can't mix two versions
+        store = open_vector_store(version, **self._store_kwargs)
+        store.load(mmap=self.mmap_index)
+        old, self.vectorstore, self._store["version"] = self.vectorstore, store, version
+        if old is not store and old.batcher is not None:
+            old.batcher.close()
+        logger.info(f"Using vector store version {version}")
+
+    def current_store(self) -> FaissVectorStore:
+        """The live store, reloading it first if persist_dir was repointed since the last check."""
+        now = time.monotonic()
+        if now >= self._store["next_check"]:
+            with self._reload_lock:
+                if now >= self._store["next_check"]:
+                    self._store["next_check"] = now + RELOAD_CHECK_INTERVAL
+                    version = os.path.realpath(self.persist_dir)
+                    if version != self._store["version"] and store_exists(version):
+                        self.reload()
+        return self.vectorstore
+
+    def index_stats(self) -> Dict[str, Any]:
+        return self.vectorstore.stats()
+
+    def retrieve(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """
+        Embed the query and return (query embedding, top-k search results).
+        filter restricts retrieval to matching chunks, e.g. {"source": "Ouneeb_CV.pdf"};
+        see FaissVectorStore.candidate_ids for the supported keys.
+        With a reranker, rerank_candidates results are fetched and the top_k best re-scored are returned.
+        """
+        store = self.current_store()
+        n_results = max(top_k, self.rerank_candidates) if self.reranker is not None else top_k
+        with metrics.stage("retrieve"):
+            if not self.hybrid:
+                query_emb, results = store.query_with_embedding(query, top_k=n_results, filter=filter)
+            else:
+                n_candidates = n_results * HYBRID_CANDIDATES_PER_K
+                query_emb, dense = store.query_with_embedding(query, top_k=n_candidates, filter=filter)
+                lexical = store.lexical_search(query, top_k=n_candidates, filter=filter)
+                results = reciprocal_rank_fusion([dense, lexical], k=self.rrf_k)[:n_results]
+            if self.reranker is not None:
+                results = self.reranker.rerank(query, results, top_k)
+        return query_emb, results
+
+    def retrieve_turn(self, query: str, history: Optional[List[Dict[str, Any]]], top_k: int = 5,
+                      filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """
+        retrieve() for one chat turn. history holds the earlier messages as {"role", "content"}
+        dicts (oldest first) and is never embedded: follow-up questions are rewritten into a
+        standalone query (see QueryRewriter) and their results are fused with the previous
+        turn's, so chunks that answered the question before stay in context.
+        """
+        store = self.current_store()
+        turns = user_turns(history)
+        scope = (store.build_id, top_k, filter_key(filter))
+        key = scope + (conversation_key(turns + [query]),)
+        cached = self.turn_cache.get(key)
+        if cached is not None:
+            return cached
+        follow_up = bool(turns) and self.rewriter.is_follow_up(query)
+        with metrics.stage("rewrite"):
+            standalone = self.rewriter.rewrite(query, history) if follow_up else query
+        query_emb, results = self.retrieve(standalone, top_k=top_k, filter=filter)
+        if follow_up:
+            previous = self.turn_cache.get(scope + (conversation_key(turns),))
+            if previous is not None:
+                results = reciprocal_rank_fusion([results, previous[1]], k=self.rrf_k)[:top_k]
+        self.turn_cache.put(key, (query_emb, results))
+        return query_emb, results
+
+    def _retrieve(self, query: str, history: Optional[List[Dict[str, Any]]], top_k: int,
+                  filter: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        if history is None:
+            return self.retrieve(query, top_k=top_k, filter=filter)
+        return self.retrieve_turn(query, history, top_k=top_k, filter=filter)
+
+    def build_prompt(self, query: str, results: List[Dict[str, Any]], history: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+        """The answer prompt; with history, the last few user questions are quoted above it."""
+        earlier = user_turns(history)[-PROMPT_HISTORY_QUESTIONS:]
+        preamble = "Earlier questions in this conversation:\n" + "".join(f"- {q}\n" for q in earlier) + "\n" if earlier else ""
+        with metrics.stage("prompt"):
+            budget = prompt_budget(self.context_token_budget, PROMPT_TEMPLATE.format(query="", context=""), query, preamble)
+            context, _ = build_context(results, budget)
         if not context:
+            return None
+        return preamble + PROMPT_TEMPLATE.format(query=query, context=context)
+
+    def _cache_key(self, results: List[Dict[str, Any]]) -> Tuple[str, str, List[int]]:
+        return self.vectorstore.build_id, self.llm_model, [int(r["index"]) for r in results]
+
+    def search_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                             history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Retrieve context for query and summarize it with the LLM. Pass history (earlier chat
+        messages, possibly empty) for conversation turns; see retrieve_turn.
+        """
+        query_emb, results = self._retrieve(query, history, top_k, filter)
+        prompt = self.build_prompt(query, results, history)
+        if prompt is None:
             return "No relevant documents found."
-        prompt = f"""Summarize the following context for the query: '{query}'\n\nContext:\n{context}\n\nSummary:"""
-        response = self.llm.invoke([prompt])
+        cached = self.answer_cache.get(*self._cache_key(results), query_emb)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        with metrics.stage("llm"):
+            response = self.llm.invoke([prompt])
+        record_llm_usage(prompt, response.content, getattr(response, "usage_metadata", None))
+        self.answer_cache.put(*self._cache_key(results), query_emb, response.content, time.perf_counter() - start)
         return response.content
 
+    def stream_search_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                                    history: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        """
+        Same as search_and_summarize, but yields the answer in pieces as the LLM
+        generates them. Cached answers are yielded in one piece.
+        """
+        query_emb, results = self._retrieve(query, history, top_k, filter)
+        prompt = self.build_prompt(query, results, history)
+        if prompt is None:
+            yield "No relevant documents found."
+            return
+        cached = self.answer_cache.get(*self._cache_key(results), query_emb)
+        if cached is not None:
+            yield cached
+            return
+        start = time.perf_counter()
+        parts, usage = [], None
+        for chunk in self.llm.stream([prompt]):
+            if chunk.content:
+                if not parts:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                parts.append(chunk.content)
+                yield chunk.content
+            usage = getattr(chunk, "usage_metadata", None) or usage
+        # Only complete answers are cached; an abandoned stream never reaches this point
+        metrics.observe("llm", time.perf_counter() - start)
+        record_llm_usage(prompt, "".join(parts), usage)
+        self.answer_cache.put(*self._cache_key(results), query_emb, "".join(parts), time.perf_counter() - start)
+
+    def _limiter(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = self._limiters[loop] = asyncio.Semaphore(self.max_concurrency)
+        return limiter
+
+    async def aretrieve(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                        history: Optional[List[Dict[str, Any]]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._retrieve, query, history, top_k, filter)
+
+    async def asearch_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                                    history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Async search_and_summarize; safe to run many concurrently from one event loop."""
+        async with self._limiter():
+            query_emb, results = await self.aretrieve(query, top_k=top_k, filter=filter, history=history)
+            prompt = self.build_prompt(query, results, history)
+            if prompt is None:
+                return "No relevant documents found."
+            cached = self.answer_cache.get(*self._cache_key(results), query_emb)
+            if cached is not None:
+                return cached
+            start = time.perf_counter()
+            with metrics.stage("llm"):
+                response = await self.llm.ainvoke([prompt])
+            record_llm_usage(prompt, response.content, getattr(response, "usage_metadata", None))
+            self.answer_cache.put(*self._cache_key(results), query_emb, response.content, time.perf_counter() - start)
+            return response.content
+
+    async def astream_search_and_summarize(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                                           history: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        """Async counterpart of stream_search_and_summarize."""
+        async with self._limiter():
+            query_emb, results = await self.aretrieve(query, top_k=top_k, filter=filter, history=history)
+            prompt = self.build_prompt(query, results, history)
+            if prompt is None:
+                yield "No relevant documents found."
+                return
+            cached = self.answer_cache.get(*self._cache_key(results), query_emb)
+            if cached is not None:
+                yield cached
+                return
+            start = time.perf_counter()
+            parts, usage = [], None
+            async for chunk in self.llm.astream([prompt]):
+                if chunk.content:
+                    if not parts:
+                        metrics.observe("llm_first_token", time.perf_counter() - start)
+                    parts.append(chunk.content)
+                    yield chunk.content
+                usage = getattr(chunk, "usage_metadata", None) or usage
+            metrics.observe("llm", time.perf_counter() - start)
+            record_llm_usage(prompt, "".join(parts), usage)
+            self.answer_cache.put(*self._cache_key(results), query_emb, "".join(parts), time.perf_counter() - start)
+
 # Example usage
 if __name__ == "__main__":
     rag_search = RAGSearch()
     query = "What is attention mechanism?"
-    summary = rag_search.search_and_summarize(query, top_k=3)
-    print("Summary:", summary)
+    print("Summary: ", end="", flush=True)
+    for token in rag_search.stream_search_and_summarize(query, top_k=3):
+        print(token, end="", flush=True)
+    print()
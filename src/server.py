@@ -0,0 +1,230 @@
+"""
+Standalone retrieval server: loads the vector store and embedding model once and serves
+many clients over HTTP/1.1 keep-alive connections.
+
+Endpoints (JSON bodies):
+    GET  /health  -> {"status": "ok", "build_id": ...}
+    GET  /metrics -> stage timings, counters and gauges in Prometheus text format
+    GET  /diagnostics -> the same metrics as JSON (see Metrics.snapshot)
+    POST /search  {"query", "top_k"?, "filter"?, "history"?}          -> {"results": [...]}
+    POST /answer  {"query", "top_k"?, "filter"?, "history"?, "llm_model"?, "stream"?}
+                  -> {"answer": ...}, or with stream=true newline-delimited
+                     {"token": ...} objects as the LLM generates them
+    history is the chat so far as [{"role": "user" | "assistant", "content"}, ...];
+    with it, follow-up questions are rewritten and retrieved per turn (RAGSearch.retrieve_turn).
+
+Usage:
+    python -m src.server --store faiss_store --port 8000
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+import numpy as np
+from src.search import RAGSearch
+from src.log import get_logger
+from src.metrics import PROMETHEUS_CONTENT_TYPE, default_metrics
+
+logger = get_logger(__name__)
+
+DEFAULT_PORT = 8000
+
+# top_k values outside this range are clamped
+MAX_TOP_K = 100
+
+
+def to_json(value: Any) -> Any:
+    """Convert NumPy scalars and arrays in search results to plain JSON types."""
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    rag: RAGSearch = None
+    # Bounds concurrent LLM calls; retrieval-only requests don't take a slot
+    answer_slots: threading.BoundedSemaphore = None
+    _clients: Dict[str, RAGSearch] = {}
+    _clients_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _rag_for(self, llm_model: str) -> RAGSearch:
+        """One RAGSearch (and pooled Groq client) per LLM model for the server's lifetime."""
+        if not llm_model:
+            return self.rag
+        with self._clients_lock:
+            if llm_model not in self._clients:
+                self._clients[llm_model] = self.rag.with_llm(llm_model)
+            return self._clients[llm_model]
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        data = json.dumps(to_json(payload)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, text: str, content_type: str):
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError(f"got {type(body).__name__}")
+        return body
+
+    @staticmethod
+    def _parse_request(body: Dict[str, Any]) -> Tuple[str, int, Any, Any]:
+        """(query, top_k, filter, history) from a request body; ValueError on bad input."""
+        query = body.get("query", "")
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("'query' is required and must be a string")
+        top_k = body.get("top_k", 5)
+        if isinstance(top_k, bool) or not isinstance(top_k, (int, float, str)):
+            raise ValueError("'top_k' must be an integer")
+        try:
+            top_k = min(max(int(top_k), 1), MAX_TOP_K)
+        except ValueError:
+            raise ValueError("'top_k' must be an integer") from None
+        filter = body.get("filter")
+        if filter is not None and not isinstance(filter, dict):
+            raise ValueError("'filter' must be an object")
+        history = body.get("history")
+        if history is not None and not (isinstance(history, list) and all(
+                isinstance(m, dict) and isinstance(m.get("role"), str) and isinstance(m.get("content", ""), str) for m in history)):
+            raise ValueError("'history' must be a list of {\"role\", \"content\"} objects")
+        if not isinstance(body.get("llm_model") or "", str):
+            raise ValueError("'llm_model' must be a string")
+        return query.strip(), top_k, filter, history
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "ok", "build_id": self.rag.current_store().build_id})
+        elif self.path == "/metrics":
+            self._send_text(default_metrics().to_prometheus(), PROMETHEUS_CONTENT_TYPE)
+        elif self.path == "/diagnostics":
+            self._send_json(default_metrics().snapshot())
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        try:
+            try:
+                body = self._read_body()
+            except ValueError as e:
+                # json.JSONDecodeError is a ValueError too
+                self._send_json({"error": f"request body must be a JSON object: {e}"}, status=400)
+                return
+            if self.path not in ("/search", "/answer"):
+                self._send_json({"error": f"unknown path {self.path}"}, status=404)
+                return
+            try:
+                query, top_k, filter, history = self._parse_request(body)
+            except ValueError as e:
+                self._send_json({"error": str(e)}, status=400)
+                return
+            if self.path == "/search":
+                if history is None:
+                    _, results = self.rag.retrieve(query, top_k=top_k, filter=filter)
+                else:
+                    _, results = self.rag.retrieve_turn(query, history, top_k=top_k, filter=filter)
+                self._send_json({"results": results})
+                return
+            rag = self._rag_for(body.get("llm_model"))
+            with self.answer_slots:
+                if body.get("stream"):
+                    self._stream_answer(rag, query, top_k, filter, history)
+                else:
+                    self._send_json({"answer": rag.search_and_summarize(query, top_k=top_k, filter=filter, history=history)})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-response
+            self.close_connection = True
+        except Exception as e:
+            logger.error(f"{self.path} failed: {e}")
+            self._send_json({"error": str(e)}, status=500)
+
+    def _stream_answer(self, rag: RAGSearch, query: str, top_k: int, filter: Any, history: Any):
+        tokens = rag.stream_search_and_summarize(query, top_k=top_k, filter=filter, history=history)
+        # Pull the first token before sending headers, so retrieval errors still get a 500
+        first = next(tokens, None)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            if first is not None:
+                self._write_chunk(json.dumps({"token": first}).encode("utf-8") + b"\n")
+            for token in tokens:
+                self._write_chunk(json.dumps({"token": token}).encode("utf-8") + b"\n")
+        except Exception as e:
+            if isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                raise
+            logger.error(f"/answer stream failed: {e}")
+            self._write_chunk(json.dumps({"error": str(e)}).encode("utf-8") + b"\n")
+        self._write_chunk(b"")
+
+
+def create_server(rag: RAGSearch, host: str = "127.0.0.1", port: int = DEFAULT_PORT, max_concurrent_answers: int = 32) -> ThreadingHTTPServer:
+    handler = type("ConfiguredRAGRequestHandler", (RAGRequestHandler,),
+                   {"rag": rag, "answer_slots": threading.BoundedSemaphore(max_concurrent_answers), "_clients": {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(rag: RAGSearch, host: str = "127.0.0.1", port: int = DEFAULT_PORT, **kwargs) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the server on a background thread; returns (server, base_url)."""
+    server = create_server(rag, host, port, **kwargs)
+    threading.Thread(target=server.serve_forever, name="rag-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="faiss_store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--llm-model", default="llama-3.3-70b-versatile", help="default model for /answer")
+    parser.add_argument("--max-concurrent-answers", type=int, default=32)
+    parser.add_argument("--query-batch", type=int, default=8, help="coalesce up to this many concurrent queries")
+    parser.add_argument("--rewrite-model", help="fast Groq model that rewrites follow-up questions (default: local heuristic)")
+    parser.add_argument("--rerank-model", help="local cross-encoder that re-ranks retrieved chunks, "
+                                               "e.g. cross-encoder/ms-marco-MiniLM-L-6-v2 (default: off)")
+    parser.add_argument("--rerank-candidates", type=int, default=20, help="chunks retrieved per query for re-ranking")
+    parser.add_argument("--rerank-budget-ms", type=float, default=300.0, help="re-ranking time limit per query")
+    args = parser.parse_args()
+
+    rag = RAGSearch(persist_dir=args.store, llm_model=args.llm_model, query_batch_size=args.query_batch, warm_model=True,
+                    rewrite_model=args.rewrite_model, rerank_model=args.rerank_model,
+                    rerank_candidates=args.rerank_candidates, rerank_budget_ms=args.rerank_budget_ms)
+    server = create_server(rag, args.host, args.port, args.max_concurrent_answers)
+    logger.info(f"RAG server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
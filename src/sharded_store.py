@@ -0,0 +1,246 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.vectorstore import FaissVectorStore
+from src.manifest import source_key
+from src.cache import QueryEmbeddingCache, default_query_cache
+from src.batching import QueryBatcher
+from src.log import get_logger
+from src.metrics import default_metrics
+
+logger = get_logger(__name__)
+metrics = default_metrics()
+
+SHARDS_FILE = "shards.json"
+
+
+def shard_of(source: str, n_shards: int) -> int:
+    """Stable shard number for a source file, from a hash of its normalized path."""
+    digest = hashlib.blake2b(source_key(source).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_shards
+
+
+class ShardedVectorStore:
+    """
+    Vector store partitioned by source file into n_shards independent FaissVectorStores,
+    each with its own index, chunk store, BM25 index and manifest under persist_dir/shard-NN.
+    Queries are embedded once and fanned out to every shard on a thread pool (Faiss
+    releases the GIL), and the per-shard top-k lists are merged.
+
+    Chunk ids returned to callers are global: local id * n_shards + shard number.
+    Every shard is only touched through _search_shard/_lexical_shard, so shards can later
+    move to worker processes or hosts without changing the merge logic.
+
+    Opening a store with a different n_shards than it was built with raises ValueError;
+    reshard=True accepts the new count, and the next update_from_directory rebuilds every
+    shard (run it on a copy, as build_jobs does, since the old shards are deleted then).
+    """
+    def __init__(self, persist_dir: str = "faiss_store", n_shards: Optional[int] = None, embedding_model: str = "all-MiniLM-L6-v2",
+                 query_cache: Optional[QueryEmbeddingCache] = None, max_batch: int = 1, max_wait_ms: float = 5.0,
+                 max_workers: Optional[int] = None, reshard: bool = False, **shard_kwargs):
+        self.persist_dir = persist_dir
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self.shards_path = os.path.join(persist_dir, SHARDS_FILE)
+        persisted = self._read_layout()
+        # n_shards=None keeps the persisted layout (4 shards for new stores)
+        self.n_shards = n_shards or persisted or 4
+        # Shard count the files on disk were built with, while it differs from n_shards
+        self._resharding_from = persisted if persisted and persisted != self.n_shards else None
+        if self._resharding_from and not reshard:
+            raise ValueError(f"Store at {persist_dir} has {persisted} shards, {self.n_shards} requested; "
+                             f"pass reshard=True to rebuild it with {self.n_shards} shards")
+        if self._resharding_from:
+            logger.warning(f"Store has {persisted} shards, {self.n_shards} requested; the next update rebuilds every shard.")
+        self.embedding_model = embedding_model
+        self.query_cache = query_cache if query_cache is not None else default_query_cache()
+        self.shards = [FaissVectorStore(self._shard_dir(i), embedding_model, query_cache=self.query_cache, **shard_kwargs)
+                       for i in range(self.n_shards)]
+        # All shards share the process-wide model, embedding cache and engine
+        self.pipeline = self.shards[0].pipeline
+        self.model = self.shards[0].model
+        self.batcher = QueryBatcher(self, max_batch=max_batch, max_wait=max_wait_ms / 1000) if max_batch > 1 else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or self.n_shards, thread_name_prefix="shard-search")
+
+    def _shard_dir(self, i: int) -> str:
+        return os.path.join(self.persist_dir, f"shard-{i:02d}")
+
+    def _read_layout(self) -> Optional[int]:
+        if not os.path.exists(self.shards_path):
+            return None
+        with open(self.shards_path, "r", encoding="utf-8") as f:
+            return json.load(f)["n_shards"]
+
+    def _write_layout(self):
+        tmp_path = self.shards_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"n_shards": self.n_shards, "partition": "source"}, f)
+        os.replace(tmp_path, self.shards_path)
+
+    def _global_id(self, shard: int, local_id: int) -> int:
+        return int(local_id) * self.n_shards + shard
+
+    def _live_shards(self) -> List[int]:
+        return [i for i, shard in enumerate(self.shards) if shard.index is not None and shard.index.ntotal]
+
+    def update_from_directory(self, data_dir: str, progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Sync every shard with its share of data_dir; returns the summed added/changed/removed counts."""
+        from src.data_loader import list_supported_files
+        paths_by_shard = defaultdict(list)
+        for path in list_supported_files(data_dir):
+            paths_by_shard[shard_of(str(path), self.n_shards)].append(path)
+        totals = {"added": 0, "changed": 0, "removed": 0, "failed": 0}
+        files_before = chunks_before = 0
+        rebuild = self._resharding_from is not None
+        for i in range(self.n_shards):
+
+            def report(event: Dict[str, Any]):
+                # Shard-local counts offset by the shards already synced; files_total only
+                # covers shards seen so far, since later shards haven't been diffed yet
+                progress({**event, "files_done": files_before + event["files_done"],
+                          "files_total": files_before + event["files_total"],
+                          "chunks_done": chunks_before + event["chunks_done"], "shard": i, "n_shards": self.n_shards})
+
+            changes = self.update_shard(i, paths_by_shard[i], progress=report if progress else None, rebuild=rebuild)
+            for key in totals:
+                totals[key] += changes[key]
+            files_before += changes["added"] + changes["changed"]
+            chunks_before = sum(len(shard.chunks) for shard in self.shards[:i + 1])
+        if rebuild:
+            for i in range(self.n_shards, self._resharding_from):
+                shutil.rmtree(self._shard_dir(i), ignore_errors=True)
+            self._resharding_from = None
+        self._write_layout()
+        logger.info(f"Sharded store synced: {totals['added']} added, {totals['changed']} changed, {totals['removed']} removed files.")
+        return totals
+
+    def update_shard(self, i: int, paths: List[Any], progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     rebuild: bool = False):
+        """Sync one shard with its file list, independently of the others; rebuild=True starts it from scratch."""
+        shard = self.shards[i]
+        if rebuild:
+            shard.close()
+            shutil.rmtree(self._shard_dir(i), ignore_errors=True)
+            shard = self.shards[i] = FaissVectorStore(self._shard_dir(i), self.embedding_model, query_cache=self.query_cache,
+                                                      chunk_size=shard.chunk_size, chunk_overlap=shard.chunk_overlap,
+                                                      index_type=shard.index_config["type"], index_params=shard.index_config["params"])
+        return shard.update_from_files(paths, progress=progress)
+
+    @property
+    def build_id(self) -> str:
+        return hashlib.sha1("/".join(shard.build_id for shard in self.shards).encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        totals = {"shards": self.n_shards}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def exists(self) -> bool:
+        return os.path.exists(self.shards_path)
+
+    def save(self):
+        for shard in self.shards:
+            if shard.index is not None:
+                shard.save()
+        # The files on disk still have the old layout until update_from_directory rebuilds them
+        if self._resharding_from is None:
+            self._write_layout()
+
+    def load(self, mmap: bool = False):
+        if self._resharding_from is not None:
+            logger.info(f"Not loading {self.persist_dir}: its {self._resharding_from}-shard layout is rebuilt on the next update.")
+            return
+        for shard in self.shards:
+            # Shards no source hashed to were never written
+            if shard.exists():
+                shard.load(mmap=mmap)
+        logger.info(f"Loaded {len(self._live_shards())} of {self.n_shards} shards from {self.persist_dir}")
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def _search_shard(self, i: int, query_embeddings: np.ndarray, top_k: int, nprobe: Optional[int], ef_search: Optional[int],
+                      filter: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        batch_results = self.shards[i].search_batch(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+        for results in batch_results:
+            for result in results:
+                result["index"] = self._global_id(i, result["index"])
+        return batch_results
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search all shards in parallel and merge each query's per-shard top-k by distance."""
+        live = self._live_shards()
+        with metrics.stage("shard_fanout"):
+            futures = [self._executor.submit(self._search_shard, i, query_embeddings, top_k, nprobe, ef_search, filter) for i in live]
+            per_shard = [future.result() for future in futures]
+        cosine = bool(live) and self.shards[live[0]].index_config["params"]["metric"] == "cosine"
+        merged = []
+        for row in range(len(query_embeddings)):
+            hits = [result for shard_results in per_shard for result in shard_results[row]]
+            hits.sort(key=lambda r: -r["distance"] if cosine else r["distance"])
+            merged.append(hits[:top_k])
+        return merged
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filter: Optional[Dict[str, Any]] = None):
+        return self.search_batch(query_embedding[:1], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def _lexical_shard(self, i: int, query_text: str, top_k: int, filter: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = self.shards[i].lexical_search(query_text, top_k=top_k, filter=filter)
+        for result in results:
+            result["index"] = self._global_id(i, result["index"])
+        return results
+
+    def lexical_search(self, query_text: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        BM25 search on every shard, merged by score. Each shard computes IDF over its own
+        chunks, so scores are only approximately comparable across shards.
+        """
+        futures = [self._executor.submit(self._lexical_shard, i, query_text, top_k, filter) for i in self._live_shards()]
+        hits = [result for future in futures for result in future.result()]
+        return sorted(hits, key=lambda r: r["score"], reverse=True)[:top_k]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        with metrics.stage("query_encode"):
+            return self.query_cache.encode(self.embedding_model, texts, self.model.encode)
+
+    def query_with_embedding(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                             filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        if self.batcher is not None:
+            return self.batcher.query(query_text, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+        query_emb = self.embed_queries([query_text])
+        return query_emb[0], self.search(query_emb, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+
+    def query(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+              filter: Optional[Dict[str, Any]] = None):
+        logger.debug("Querying sharded vector store for: '%s'", query_text)
+        return self.query_with_embedding(query_text, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[1]
+
+
+def store_exists(persist_dir: str) -> bool:
+    """Whether persist_dir holds a built store of either layout."""
+    return os.path.exists(os.path.join(persist_dir, SHARDS_FILE)) or os.path.exists(os.path.join(persist_dir, "faiss.index"))
+
+
+def open_vector_store(persist_dir: str = "faiss_store", n_shards: Optional[int] = None, **kwargs):
+    """ShardedVectorStore if persist_dir holds a sharded store or n_shards is given, else FaissVectorStore."""
+    if n_shards or os.path.exists(os.path.join(persist_dir, SHARDS_FILE)):
+        return ShardedVectorStore(persist_dir, n_shards=n_shards, **kwargs)
+    return FaissVectorStore(persist_dir, **kwargs)
+
+
+# Example usage
+if __name__ == "__main__":
+    store = ShardedVectorStore("faiss_store_sharded", n_shards=4)
+    store.update_from_directory("data")
+    print(store.query("What is attention mechanism?", top_k=3))
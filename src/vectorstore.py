@@ -1,76 +1,413 @@
 import os
+import time
 import faiss
 import numpy as np
 import pickle
-from typing import List, Any
-from sentence_transformers import SentenceTransformer
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 from src.embedding import EmbeddingPipeline
+from src.models import LazyEmbeddingModel
+from src.manifest import IndexManifest, file_hash, source_key
+from src.chunkstore import ChunkStore
+from src.bm25 import BM25Index
+from src.cache import QueryEmbeddingCache, default_query_cache
+from src.embedding_cache import EmbeddingCache
+from src.batching import QueryBatcher
+from src.index_factory import index_config, build_signature, needs_training, prepare_vectors, create_index, train_index, search_parameters, rebuild_without, is_fallback, min_train_vectors, retrain_fallback
+from src.log import get_logger
+from src.metrics import default_metrics
+
+logger = get_logger(__name__)
+metrics = default_metrics()
+
+# Filtered searches over at most this many candidates scan the subset exactly
+SUBSET_SEARCH_MAX = 4096
 
 class FaissVectorStore:
-    def __init__(self, persist_dir: str = "faiss_store", embedding_model: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, persist_dir: str = "faiss_store", embedding_model: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, chunk_overlap: int = 200,
+                 index_type: Optional[str] = None, index_params: Optional[Dict[str, Any]] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None, max_batch: int = 1, max_wait_ms: float = 5.0,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         self.persist_dir = persist_dir
         os.makedirs(self.persist_dir, exist_ok=True)
         self.index = None
-        self.metadata = []
+        # Vector id -> chunk metadata, memory-mapped; ids are stable across incremental updates
+        self.chunks = ChunkStore(self.persist_dir)
+        # Lexical index over the same chunk ids, for hybrid retrieval
+        self.bm25 = BM25Index(self.persist_dir)
         self.embedding_model = embedding_model
-        self.model = SentenceTransformer(embedding_model)
+        # Shared with EmbeddingPipeline and other stores; loaded on first encode
+        self.model = LazyEmbeddingModel(embedding_model)
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        print(f"[INFO] Loaded embedding model: {embedding_model}")
-
-    def build_from_documents(self, documents: List[Any]):
-        print(f"[INFO] Building vector store from {len(documents)} raw documents...")
-        emb_pipe = EmbeddingPipeline(model_name=self.embedding_model, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
-        chunks = emb_pipe.chunk_documents(documents)
-        embeddings = emb_pipe.embed_chunks(chunks)
-        metadatas = [{"text": chunk.page_content} for chunk in chunks]
-        self.add_embeddings(np.array(embeddings).astype('float32'), metadatas)
+        # Keyed by model name, so one process-wide cache is safe to share between stores
+        self.query_cache = query_cache if query_cache is not None else default_query_cache()
+        self.pipeline = EmbeddingPipeline(model_name=embedding_model, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                          embedding_cache=embedding_cache)
+        # max_batch > 1 coalesces concurrent queries into batched encode + search calls
+        self.batcher = QueryBatcher(self, max_batch=max_batch, max_wait=max_wait_ms / 1000) if max_batch > 1 else None
+        self.manifest = IndexManifest(self.persist_dir)
+        # index_type=None keeps whatever index type a persisted store was built with (flat for new stores)
+        self.index_config = index_config(index_type or "flat", index_params)
+        self._explicit_index = index_type is not None
+
+    def _settings(self) -> Dict[str, Any]:
+        return {"embedding_model": self.embedding_model, "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap,
+                "index": self.index_config}
+
+    def _is_compatible(self) -> bool:
+        """Whether the persisted store was built with settings that allow incremental updates."""
+        persisted, current = dict(self.manifest.settings), self._settings()
+        persisted_index, current_index = persisted.pop("index", None), current.pop("index")
+        return persisted == current and build_signature(persisted_index) == build_signature(current_index)
+
+    def _index_documents(self, documents: Iterable[Any], progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                         n_files: int = 0) -> Dict[str, List[int]]:
+        """
+        Chunk, embed and add streamed documents batch by batch; return new vector ids grouped by source.
+        progress, if given, receives {"files_done", "files_total", "chunks_done", "chunks_per_sec"} as embedding advances.
+        """
+        emb_pipe = self.pipeline
+        ids_by_source = defaultdict(list)
+        sources_seen = set()
+        chunks_before = 0
+        start = time.perf_counter()
+
+        def report(done: int, total: int, rate: float):
+            chunks_done = chunks_before + done
+            progress({"files_done": len(sources_seen), "files_total": n_files, "chunks_done": chunks_done,
+                      "chunks_per_sec": chunks_done / max(time.perf_counter() - start, 1e-9)})
+        # Indexes that need training buffer vectors until there is a big enough sample
+        pending_chunks, pending_embeddings = [], []
+        train_size = self.index_config["params"]["train_size"]
+
+        def flush():
+            embeddings = np.vstack(pending_embeddings)
+            for source, ids in self._index_chunks(pending_chunks, embeddings).items():
+                ids_by_source[source].extend(ids)
+            pending_chunks.clear()
+            pending_embeddings.clear()
+
+        for chunks in emb_pipe.iter_chunk_batches(documents):
+            pending_chunks.extend(chunks)
+            # A batch's last source may continue in the next one; count it as done anyway
+            sources_seen.update(chunk.metadata.get("source") for chunk in chunks)
+            pending_embeddings.append(np.array(emb_pipe.embed_chunks(chunks, progress=report if progress else None)).astype('float32'))
+            chunks_before += len(chunks)
+            if self.index is None and needs_training(self.index_config) and len(pending_chunks) < train_size:
+                continue
+            flush()
+        if pending_chunks:
+            flush()
+        return ids_by_source
+
+    def _index_chunks(self, chunks: List[Any], embeddings: np.ndarray) -> Dict[str, List[int]]:
+        """Add chunk vectors under freshly allocated ids and return the ids grouped by source."""
+        ids = self.manifest.allocate_ids(len(chunks))
+        mtimes: Dict[str, Optional[float]] = {}
+        metadatas = [self._chunk_metadata(chunk, mtimes) for chunk in chunks]
+        self.add_embeddings(embeddings, metadatas, ids=ids)
+        ids_by_source = defaultdict(list)
+        for meta, vec_id in zip(metadatas, ids):
+            if "source" in meta:
+                ids_by_source[meta["source"]].append(vec_id)
+        return ids_by_source
+
+    @staticmethod
+    def _chunk_metadata(chunk: Any, mtimes: Dict[str, Optional[float]]) -> Dict[str, Any]:
+        """Chunk text plus provenance: source path, file type, mtime, page and character offsets."""
+        meta = {"text": chunk.page_content}
+        source = chunk.metadata.get("source")
+        if source:
+            path = source_key(source)
+            if path not in mtimes:
+                mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else None
+            meta["source"] = path
+            meta["file_type"] = Path(path).suffix.lower().lstrip(".")
+            if mtimes[path] is not None:
+                meta["mtime"] = mtimes[path]
+        if chunk.metadata.get("page") is not None:
+            meta["page"] = int(chunk.metadata["page"])
+        start = chunk.metadata.get("start_index")
+        if start is not None and start >= 0:
+            meta["start"] = int(start)
+            meta["end"] = int(start) + len(chunk.page_content)
+        return meta
+
+    def _reset(self):
+        self.index = None
+        self.chunks.reset()
+        self.bm25.reset()
+        self.manifest.reset(self._settings())
+
+    def build_from_documents(self, documents: Iterable[Any], progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        logger.info("Building vector store from raw documents...")
+        self._reset()
+        for source, ids in self._index_documents(documents, progress=progress).items():
+            if os.path.exists(source):
+                self.manifest.record(source, file_hash(source), ids, mtime=os.path.getmtime(source))
+        self.save()
+        logger.info(f"Vector store built and saved to {self.persist_dir}")
+
+    def update_from_directory(self, data_dir: str, progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Incrementally sync the store with data_dir: embed only new or changed files,
+        drop vectors of deleted files and leave unchanged files untouched.
+        Starts from scratch if no compatible manifest exists. progress: see _index_documents.
+        """
+        from src.data_loader import list_supported_files
+        return self.update_from_files(list_supported_files(data_dir), progress=progress)
+
+    def update_from_files(self, paths: Iterable[Any], progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """update_from_directory over an explicit file list; files indexed before but not listed are removed."""
+        from src.data_loader import iter_file_documents
+        if self.exists():
+            self.load()
+        if self.index is None or not self.manifest.exists() or not self._is_compatible():
+            logger.info("No compatible manifest found, doing a full rebuild.")
+            self._reset()
+
+        current = {source_key(p): file_hash(str(p)) for p in paths}
+        added, changed, removed = self.manifest.diff(current)
+        logger.info(f"Incremental update: {len(added)} added, {len(changed)} changed, {len(removed)} removed files.")
+        if not (added or changed or removed):
+            return {"added": 0, "changed": 0, "removed": 0, "failed": 0}
+
+        stale_ids = []
+        for source in changed + removed:
+            stale_ids.extend(self.manifest.drop(source))
+        self.remove_ids(stale_ids)
+
+        failed = set()
+        ids_by_source = self._index_documents(iter_file_documents(added + changed, failed=failed), progress=progress,
+                                              n_files=len(added) + len(changed))
+        for source in added + changed:
+            # Files that failed to load stay out of the manifest, so the next update retries them
+            if source in failed:
+                continue
+            self.manifest.record(source, current[source], ids_by_source.get(source, []), mtime=os.path.getmtime(source))
+        if failed:
+            logger.warning(f"{len(failed)} file(s) failed to load and will be retried on the next update.")
         self.save()
-        print(f"[INFO] Vector store built and saved to {self.persist_dir}")
+        return {"added": len(added), "changed": len(changed), "removed": len(removed), "failed": len(failed)}
 
-    def add_embeddings(self, embeddings: np.ndarray, metadatas: List[Any] = None):
+    def add_embeddings(self, embeddings: np.ndarray, metadatas: List[Any] = None, ids: List[int] = None):
+        embeddings = prepare_vectors(self.index_config, embeddings)
         dim = embeddings.shape[1]
         if self.index is None:
-            self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
+            self.index = create_index(self.index_config, dim, n_train=embeddings.shape[0])
+            self.manifest.settings = self._settings()
+        train_index(self.index, embeddings, self.index_config["params"]["train_size"])
+        if ids is None:
+            ids = self.manifest.allocate_ids(embeddings.shape[0])
+        with metrics.stage("index_add"):
+            self.index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
         if metadatas:
-            self.metadata.extend(metadatas)
-        print(f"[INFO] Added {embeddings.shape[0]} vectors to Faiss index.")
+            self.chunks.add(ids, metadatas)
+            self.bm25.add(ids, (meta.get("text", "") for meta in metadatas))
+        logger.info(f"Added {embeddings.shape[0]} vectors to Faiss index.")
+        # A store that started too small for IVF becomes the configured index once it can be trained
+        if is_fallback(self.index, self.index_config) and self.index.ntotal >= min_train_vectors(self.index_config):
+            logger.info(f"Store has {self.index.ntotal} vectors; rebuilding its flat index as {self.index_config['type']}.")
+            self.index = retrain_fallback(self.index, self.index_config)
+        return ids
 
-    def save(self):
+    def remove_ids(self, ids: List[int]):
+        if not ids or self.index is None:
+            return 0
+        ids = np.asarray(ids, dtype='int64')
+        before = self.index.ntotal
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW graphs don't support deletion
+            self.index = rebuild_without(self.index, self.index_config, ids)
+        removed = before - (self.index.ntotal if self.index is not None else 0)
+        self.chunks.remove(ids.tolist())
+        self.bm25.remove(ids.tolist())
+        logger.info(f"Removed {removed} vectors from Faiss index.")
+        return removed
+
+    @property
+    def build_id(self) -> str:
+        return self.manifest.build_id
+
+    def stats(self) -> Dict[str, Any]:
+        """Index and chunk store size, for metrics collectors."""
+        return {"vectors": self.index.ntotal if self.index is not None else 0, "chunks": len(self.chunks),
+                "files": len(self.manifest.files)}
+
+    def exists(self) -> bool:
         faiss_path = os.path.join(self.persist_dir, "faiss.index")
         meta_path = os.path.join(self.persist_dir, "metadata.pkl")
-        faiss.write_index(self.index, faiss_path)
-        with open(meta_path, "wb") as f:
-            pickle.dump(self.metadata, f)
-        print(f"[INFO] Saved Faiss index and metadata to {self.persist_dir}")
+        return os.path.exists(faiss_path) and (self.chunks.exists() or os.path.exists(meta_path))
 
-    def load(self):
+    def save(self):
         faiss_path = os.path.join(self.persist_dir, "faiss.index")
+        if self.index is not None:
+            # Write then rename: readers that memory-mapped the old file keep a valid mapping
+            faiss.write_index(self.index, faiss_path + ".tmp")
+            os.replace(faiss_path + ".tmp", faiss_path)
+        self.chunks.flush()
+        self.bm25.save()
+        self.manifest.save()
+        logger.info(f"Saved Faiss index and metadata to {self.persist_dir}")
+
+    def close(self):
+        """Release the memory-mapped chunk store and stop the query batcher."""
+        self.chunks.close()
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def load(self, mmap: bool = False):
+        """
+        Load the persisted store. mmap=True maps the index file instead of reading it, so
+        loading is near-instant and pages are read on first use; use it for stores that are
+        only queried (IVF indexes become read-only, and adds to them fail).
+        """
+        faiss_path = os.path.join(self.persist_dir, "faiss.index")
+        self.index = faiss.read_index(faiss_path, faiss.IO_FLAG_MMAP if mmap else 0)
+        if self.chunks.exists():
+            self.chunks.open()
+        else:
+            self._migrate_pickled_metadata()
+        if self.bm25.exists():
+            self.bm25.load()
+        else:
+            self._rebuild_bm25()
+        if self.manifest.exists():
+            self.manifest.load()
+            persisted_index = self.manifest.settings.get("index")
+            if persisted_index and not self._explicit_index:
+                self.index_config = index_config(persisted_index["type"], persisted_index["params"])
+        logger.info(f"Loaded Faiss index and metadata from {self.persist_dir}")
+
+    def _rebuild_bm25(self):
+        """Build the lexical index from stored chunks (stores created before it existed)."""
+        self.bm25.reset()
+        ids = self.chunks.ids()
+        self.bm25.add(ids, ((meta or {}).get("text", "") for meta in self.chunks.get_many(ids)))
+        self.bm25.save()
+        logger.info(f"Built BM25 index over {len(ids)} chunks.")
+
+    def _migrate_pickled_metadata(self):
+        """Convert a legacy metadata.pkl into the memory-mapped chunk store."""
         meta_path = os.path.join(self.persist_dir, "metadata.pkl")
-        self.index = faiss.read_index(faiss_path)
         with open(meta_path, "rb") as f:
-            self.metadata = pickle.load(f)
-        print(f"[INFO] Loaded Faiss index and metadata from {self.persist_dir}")
-
-    def search(self, query_embedding: np.ndarray, top_k: int = 5):
-        D, I = self.index.search(query_embedding, top_k)
-        results = []
-        for idx, dist in zip(I[0], D[0]):
-            meta = self.metadata[idx] if idx < len(self.metadata) else None
-            results.append({"index": idx, "distance": dist, "metadata": meta})
-        return results
-
-    def query(self, query_text: str, top_k: int = 5):
-        print(f"[INFO] Querying vector store for: '{query_text}'")
-        query_emb = self.model.encode([query_text]).astype('float32')
-        return self.search(query_emb, top_k=top_k)
+            metadata = pickle.load(f)
+        # Stores written before id mapping kept a positional list
+        items = enumerate(metadata) if isinstance(metadata, list) else metadata.items()
+        ids, metas = zip(*items) if metadata else ((), ())
+        self.chunks.reset()
+        self.chunks.add(ids, metas)
+        self.chunks.flush()
+        os.remove(meta_path)
+        logger.info(f"Migrated {len(ids)} chunks from metadata.pkl to the chunk store.")
+
+    def candidate_ids(self, filter: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """
+        Chunk ids matching a metadata filter, resolved from the manifest; None means no filter.
+        Supported keys (each optional, values may be a single item or a list):
+          source: file path or bare file name, e.g. "Ouneeb_CV.pdf"
+          file_type: extension without the dot, e.g. "pdf"
+          modified_after: epoch seconds
+        """
+        if not filter:
+            return None
+        as_set = lambda value: set(value if isinstance(value, (list, tuple, set)) else [value]) if value else set()
+        names = as_set(filter.get("source"))
+        paths = {source_key(name) for name in names}
+        file_types = {t.lower().lstrip(".") for t in as_set(filter.get("file_type"))}
+        modified_after = filter.get("modified_after")
+        ids = []
+        for path, entry in self.manifest.files.items():
+            if names and path not in paths and Path(path).name not in names:
+                continue
+            if file_types and Path(path).suffix.lower().lstrip(".") not in file_types:
+                continue
+            if modified_after is not None and entry.get("mtime", 0) < modified_after:
+                continue
+            ids.extend(entry["ids"])
+        return np.array(sorted(ids), dtype='int64')
+
+    def _subset_search(self, query_embeddings: np.ndarray, candidates: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search over a small candidate set using vectors reconstructed from the index."""
+        vectors = self.index.reconstruct_batch(candidates)
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = query_embeddings @ vectors.T
+            order = np.argsort(-scores, axis=1)[:, :top_k]
+        else:
+            scores = (query_embeddings ** 2).sum(1)[:, None] - 2 * query_embeddings @ vectors.T + (vectors ** 2).sum(1)[None, :]
+            order = np.argsort(scores, axis=1)[:, :top_k]
+        return np.take_along_axis(scores, order, axis=1), candidates[order]
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search several query embeddings in one index.search call; one result list per row.
+        "distance" is squared L2 (lower is better), or cosine similarity (higher is better)
+        for stores built with metric="cosine".
+        filter (see candidate_ids) restricts results to matching chunks: small candidate sets
+        are scanned exactly, larger ones are searched through a Faiss ID selector.
+        """
+        query_embeddings = prepare_vectors(self.index_config, query_embeddings)
+        candidates = self.candidate_ids(filter)
+        D = I = None
+        if candidates is not None and len(candidates) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        with metrics.stage("search"):
+            if candidates is not None and len(candidates) <= SUBSET_SEARCH_MAX:
+                try:
+                    D, I = self._subset_search(query_embeddings, candidates, top_k)
+                except RuntimeError:
+                    # IVF indexes can't reconstruct without a direct map; use the selector instead
+                    pass
+            if I is None:
+                selector = faiss.IDSelectorBatch(candidates) if candidates is not None else None
+                params = search_parameters(self.index, self.index_config, nprobe=nprobe, ef_search=ef_search, selector=selector)
+                D, I = self.index.search(query_embeddings, top_k, params=params)
+        batch_results = []
+        with metrics.stage("metadata"):
+            for ids, dists in zip(I, D):
+                hits = [(idx, dist) for idx, dist in zip(ids, dists) if idx != -1]
+                # Only the top-k rows are read from the memory-mapped chunk store
+                metas = self.chunks.get_many(idx for idx, _ in hits)
+                batch_results.append([{"index": idx, "distance": dist, "metadata": meta} for (idx, dist), meta in zip(hits, metas)])
+        return batch_results
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filter: Optional[Dict[str, Any]] = None):
+        return self.search_batch(query_embedding[:1], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def lexical_search(self, query_text: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25 keyword search over the stored chunks; results carry a score instead of a distance."""
+        with metrics.stage("lexical"):
+            hits = self.bm25.search(query_text, top_k=top_k, allowed_ids=self.candidate_ids(filter))
+        with metrics.stage("metadata"):
+            metas = self.chunks.get_many(idx for idx, _ in hits)
+        return [{"index": idx, "score": score, "metadata": meta} for (idx, score), meta in zip(hits, metas)]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Encode query strings, reusing cached embeddings for repeated queries."""
+        with metrics.stage("query_encode"):
+            return self.query_cache.encode(self.embedding_model, texts, self.model.encode)
+
+    def query_with_embedding(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                             filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Return (query embedding, results), going through the query batcher when enabled."""
+        if self.batcher is not None:
+            return self.batcher.query(query_text, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+        query_emb = self.embed_queries([query_text])
+        return query_emb[0], self.search(query_emb, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+
+    def query(self, query_text: str, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+              filter: Optional[Dict[str, Any]] = None):
+        logger.debug("Querying vector store for: '%s'", query_text)
+        return self.query_with_embedding(query_text, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[1]
 
 # Example usage
 if __name__ == "__main__":
-    from data_loader import load_all_documents
-    docs = load_all_documents("data")
     store = FaissVectorStore("faiss_store")
-    store.build_from_documents(docs)
-    store.load()
+    store.update_from_directory("data")
     print(store.query("What is attention mechanism?", top_k=3))
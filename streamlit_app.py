@@ -50,20 +50,43 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=30, show_spinner=False)
+def external_server_url():
+    """RAG_SERVER_URL if it points at a running server (thin-client mode), else None."""
+    url = os.getenv("RAG_SERVER_URL")
+    if url:
+        from src.client import RAGClient
+        if RAGClient(url).is_available():
+            return url
+    return None
+
+
 # Sidebar for configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
 
-    # API Key input
-    groq_api_key = st.text_input(
-        "Groq API Key",
-        value=os.getenv("GROQ_API_KEY", ""),
-        type="password",
-        help="Get your API key from https://console.groq.com/"
-    )
+    server_url = external_server_url()
+    if server_url:
+        # Thin-client mode: the external server answers with the GROQ_API_KEY of its own environment
+        groq_api_key = ""
+        st.text_input(
+            "Groq API Key",
+            value="",
+            disabled=True,
+            placeholder="Configured on the RAG server",
+            help=f"Answers come from {server_url}, which uses its own GROQ_API_KEY"
+        )
+    else:
+        # API Key input
+        groq_api_key = st.text_input(
+            "Groq API Key",
+            value=os.getenv("GROQ_API_KEY", ""),
+            type="password",
+            help="Get your API key from https://console.groq.com/"
+        )
 
-    if groq_api_key:
-        os.environ["GROQ_API_KEY"] = groq_api_key
+        if groq_api_key:
+            os.environ["GROQ_API_KEY"] = groq_api_key
 
     st.markdown("---")
 
@@ -75,9 +98,20 @@ with st.sidebar:
     )
 
     # Number of results
-    top_k = st.slider("📊 Context Chunks", min_value=1, max_value=10, value=5,
+    # With a re-ranker (RAG_RERANK_MODEL) fewer, better-ordered chunks are enough
+    top_k = st.slider("📊 Context Chunks", min_value=1, max_value=10, value=3 if os.getenv("RAG_RERANK_MODEL") else 5,
                       help="Number of relevant document chunks to retrieve")
 
+    # Restrict retrieval to selected documents: the files a build indexes (subfolders
+    # included), as paths the "source" filter resolves to the same manifest keys
+    from src.data_loader import list_supported_files
+    doc_filter_names = st.multiselect(
+        "📄 Restrict to documents",
+        [os.path.relpath(p) for p in list_supported_files("data")],
+        format_func=lambda path: os.path.relpath(path, "data"),
+        help="Only search the selected documents (all documents when empty)"
+    )
+
     st.markdown("---")
 
     # Vector store status
@@ -99,49 +133,53 @@ with st.sidebar:
         st.warning("⚠️ Not built")
         st.caption("Upload documents and build the store")
 
-    # Build vector store button
+    # Build vector store button: runs in the background and swaps the store in when done,
+    # so chat keeps working during the build
+    from src.build_jobs import read_job_state, start_build
+
     if st.button("🔨 Build/Rebuild Vector Store", key="build_vector_store",
                  use_container_width=True, type="primary"):
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-
-        try:
-            status_text.text("📂 Loading documents...")
-            progress_bar.progress(20)
-
-            from src.data_loader import load_all_documents
-            from src.vectorstore import FaissVectorStore
-
-            docs = load_all_documents("data")
-
-            if len(docs) == 0:
-                st.error("❌ No documents found in the 'data' directory!")
-                st.info("👆 Upload some documents first!")
-            else:
-                status_text.text(f"📝 Processing {len(docs)} documents...")
-                progress_bar.progress(40)
-
-                status_text.text("🔢 Creating embeddings...")
-                progress_bar.progress(60)
-
-                store = FaissVectorStore("faiss_store")
-                store.build_from_documents(docs)
-
-                status_text.text("💾 Saving vector store...")
-                progress_bar.progress(80)
-
-                time.sleep(0.5)
-                progress_bar.progress(100)
-                status_text.text("✅ Complete!")
-
-                st.success(f"✅ Vector store built from {len(docs)} documents!")
-                time.sleep(1)
+        from src.data_loader import list_supported_files
+
+        if len(list_supported_files("data")) == 0:
+            st.error("❌ No documents found in the 'data' directory!")
+            st.info("👆 Upload some documents first!")
+        else:
+            start_build("data", "faiss_store")
+
+    build_state = read_job_state("faiss_store")
+    build_running = build_state is not None and build_state["status"] == "running"
+
+    @st.fragment(run_every=1 if build_running else None)
+    def build_status():
+        state = read_job_state("faiss_store")
+        if state is None:
+            return
+        if state["status"] == "running":
+            files_total = max(state["files_total"], 1)
+            st.progress(min(state["files_done"] / files_total, 1.0))
+            st.caption(
+                f"🔢 Embedding: {state['files_done']}/{state['files_total']} files, "
+                f"{state['chunks_done']} chunks ({state['chunks_per_sec']:.1f} chunks/sec)"
+            )
+        elif state["status"] == "done":
+            changes = state["changes"]
+            st.success(
+                f"✅ Vector store synced "
+                f"({changes['added']} added, {changes['changed']} changed, {changes['removed']} removed)!"
+            )
+            cache_stats = state["embedding_cache"]
+            st.caption(f"Embedding cache: {cache_stats['hits']} chunks reused, {cache_stats['misses']} encoded, "
+                       f"{cache_stats['bytes'] / 2**20:.1f} MiB on disk")
+        else:
+            st.error(f"❌ Build failed: {state.get('error')}")
+        # Rerun the whole app once per finished build so the status and chat pick it up
+        if state["status"] != "running" and st.session_state.get("seen_build") != state["job_id"]:
+            st.session_state.seen_build = state["job_id"]
+            if build_running or st.session_state.rag_search is None:
                 st.rerun()
 
-        except Exception as e:
-            st.error(f"❌ Error: {str(e)}")
-            progress_bar.empty()
-            status_text.empty()
+    build_status()
 
     st.markdown("---")
 
@@ -159,6 +197,33 @@ with st.sidebar:
     if len(st.session_state.messages) > 0:
         st.metric("💬 Messages", len(st.session_state.messages))
 
+    # Per-stage timings and cache/token counters from the RAG server
+    if st.session_state.rag_search is not None:
+        with st.expander("🩺 Diagnostics"):
+            try:
+                diagnostics = st.session_state.rag_search.diagnostics()
+            except Exception as e:
+                st.caption(f"Diagnostics unavailable: {e}")
+            else:
+                if not diagnostics["enabled"]:
+                    st.caption("Metrics are disabled (RAG_METRICS=0).")
+                elif diagnostics["stages"]:
+                    st.dataframe(
+                        [{"stage": name, "count": s["count"], "mean ms": s["mean_ms"],
+                          "p50 ms": s["p50_ms"], "p95 ms": s["p95_ms"]}
+                         for name, s in diagnostics["stages"].items()],
+                        hide_index=True, use_container_width=True
+                    )
+                gauges, counters = diagnostics["gauges"], diagnostics["counters"]
+                if "query_cache_hit_rate" in gauges:
+                    st.caption(f"Query cache hit rate: {gauges['query_cache_hit_rate']:.0%} · "
+                               f"answer cache hit rate: {gauges.get('answer_cache_hit_rate', 0):.0%}")
+                if counters.get("llm_requests"):
+                    st.caption(f"LLM calls: {counters['llm_requests']:.0f} · tokens in/out: "
+                               f"{counters.get('llm_tokens_in', 0):.0f}/{counters.get('llm_tokens_out', 0):.0f}")
+                if "index_vectors" in gauges:
+                    st.caption(f"Index: {gauges['index_vectors']:.0f} vectors from {gauges.get('index_files', 0):.0f} files")
+
     # Footer
     st.markdown("---")
     st.caption("Built with Streamlit, LangChain, FAISS & Groq")
@@ -167,8 +232,8 @@ with st.sidebar:
 st.title("🤖 RAG ChatBot")
 st.markdown("Chat with your documents using AI - powered by Groq LLM")
 
-# Check API key
-if not groq_api_key:
+# Check API key (an external server brings its own)
+if not groq_api_key and not server_url:
     st.warning("⚠️ Please enter your Groq API Key in the sidebar")
     st.info("👉 Get your free API key at: https://console.groq.com/")
 
@@ -194,9 +259,11 @@ with st.expander("📤 Upload Documents", expanded=st.session_state.show_upload)
     st.markdown("Supported formats: PDF, TXT, CSV, DOCX, XLSX, JSON")
 
     # File uploader with multiple files
+    # Whatever the loader registry supports, so the two can't drift apart
+    from src.data_loader import LOADERS
     uploaded_files = st.file_uploader(
         "Choose files",
-        type=["txt", "pdf", "csv", "docx", "xlsx", "json"],
+        type=sorted(extension.lstrip(".") for extension in LOADERS),
         accept_multiple_files=True,
         help="Select one or more documents to upload"
     )
@@ -242,18 +309,34 @@ with st.expander("📤 Upload Documents", expanded=st.session_state.show_upload)
         st.session_state.show_upload = False
 
 # Initialize RAG search
+@st.cache_resource
+def rag_server_url() -> str:
+    """URL of the shared RAG server (RAG_SERVER_URL); starts one in this process if none is running."""
+    from src.client import RAGClient, default_server_url
+    url = default_server_url()
+    if RAGClient(url).is_available():
+        return url
+    from src.search import RAGSearch
+    from src.server import serve_in_thread
+    # One store and model for every session, instead of one per session
+    # The model loads in the background while the UI renders
+    rag = RAGSearch(persist_dir="faiss_store", warm_model=True, rerank_model=os.getenv("RAG_RERANK_MODEL"))
+    _, url = serve_in_thread(rag, port=0)
+    return url
+
+
 if faiss_path.exists() and st.session_state.rag_search is None:
     try:
         with st.spinner("🔄 Initializing RAG system..."):
-            from src.search import RAGSearch
-            st.session_state.rag_search = RAGSearch(
-                persist_dir="faiss_store",
-                llm_model=llm_model
-            )
+            from src.client import RAGClient
+            st.session_state.rag_search = RAGClient(rag_server_url(), llm_model=llm_model)
     except Exception as e:
         st.error(f"❌ Error initializing RAG: {str(e)}")
         st.stop()
 
+if st.session_state.rag_search is not None:
+    st.session_state.rag_search.llm_model = llm_model
+
 # Display chat history
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -280,48 +363,46 @@ if prompt := st.chat_input("💬 Ask a question about your documents...",
     # Generate response
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
+        message_placeholder.markdown("🤔 Thinking...")
 
-        with st.spinner("🤔 Thinking..."):
-            try:
-                # Get conversation context
-                context_messages = st.session_state.messages[-6:] if len(st.session_state.messages) > 6 else st.session_state.messages
-                conversation_context = "\n".join([
-                    f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-                    for msg in context_messages[:-1]
-                ])
-
-                # Enhanced query with context
-                if conversation_context:
-                    enhanced_query = f"Previous conversation:\n{conversation_context}\n\nCurrent question: {prompt}"
-                else:
-                    enhanced_query = prompt
-
-                # Get answer
-                answer = st.session_state.rag_search.search_and_summarize(
-                    enhanced_query,
-                    top_k=top_k
-                )
-
-                # Display answer
-                message_placeholder.markdown(answer)
-                response_timestamp = datetime.now().strftime("%I:%M %p")
-                st.caption(response_timestamp)
-
-                # Save to history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": answer,
-                    "timestamp": response_timestamp
-                })
+        try:
+            # Earlier messages go separately; the server turns follow-ups into standalone queries
+            history = [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in st.session_state.messages[-7:-1]
+            ]
+
+            # Stream the answer into the placeholder as tokens arrive
+            answer = ""
+            for token in st.session_state.rag_search.stream_search_and_summarize(
+                prompt,
+                top_k=top_k,
+                filter={"source": doc_filter_names} if doc_filter_names else None,
+                history=history
+            ):
+                answer += token
+                message_placeholder.markdown(answer + "▌")
+
+            # Display answer
+            message_placeholder.markdown(answer)
+            response_timestamp = datetime.now().strftime("%I:%M %p")
+            st.caption(response_timestamp)
+
+            # Save to history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": answer,
+                "timestamp": response_timestamp
+            })
 
-            except Exception as e:
-                error_msg = f"❌ Sorry, I encountered an error: {str(e)}"
-                message_placeholder.error(error_msg)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_msg,
-                    "timestamp": datetime.now().strftime("%I:%M %p")
-                })
+        except Exception as e:
+            error_msg = f"❌ Sorry, I encountered an error: {str(e)}"
+            message_placeholder.error(error_msg)
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": error_msg,
+                "timestamp": datetime.now().strftime("%I:%M %p")
+            })
 
 # Welcome message and sample questions
 if len(st.session_state.messages) == 0 and faiss_path.exists():